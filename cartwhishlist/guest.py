@@ -0,0 +1,159 @@
+import time
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from products.models import Product
+from .models import Cart
+from .operations import MAX_LINE_QUANTITY, apply_cart_operations, fold_operations
+
+# Guest carts live only in the cache, keyed by a signed token the client
+# keeps (X-Cart-Token header). Browsing never writes to the database; the
+# lines become Cart rows only when the guest logs in or signs up. Writes are
+# load-apply-save on one cache entry, so they run under a per-cart lock (a
+# cache.add key, as for catalog snapshots); concurrent requests from the same
+# guest queue up instead of overwriting each other's lines.
+
+TOKEN_HEADER = 'HTTP_X_CART_TOKEN'
+TOKEN_SALT = 'cartwhishlist.guest-cart'
+GUEST_CART_TIMEOUT = getattr(settings, 'GUEST_CART_TIMEOUT', 60 * 60 * 24 * 7)
+MAX_GUEST_LINES = 100
+LOCK_TIMEOUT = 10  # a writer that dies holding the lock blocks the cart this long
+LOCK_WAIT_SECONDS = 3
+LOCK_POLL_INTERVAL = 0.02
+
+
+class CartBusy(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The cart is being updated by another request; try again.'
+    default_code = 'cart_busy'
+
+
+def new_token():
+    return signing.dumps(uuid.uuid4().hex, salt=TOKEN_SALT)
+
+
+def cart_id(token):
+    """The cart id inside a token, or None if it's missing or forged."""
+    if not token:
+        return None
+    try:
+        # No max_age: the cache timeout (refreshed on every write) expires carts
+        return signing.loads(token, salt=TOKEN_SALT)
+    except signing.BadSignature:
+        return None
+
+
+def request_token(request):
+    """The guest cart token from the X-Cart-Token header or a `cart_token` body field."""
+    token = request.META.get(TOKEN_HEADER)
+    if not token and isinstance(request.data, dict):
+        token = request.data.get('cart_token')
+    return token
+
+
+def cache_key(guest_id):
+    return f"guest-cart:{guest_id}"
+
+
+@contextmanager
+def locked(token):
+    """
+    Hold the write lock of the token's cart for the block. Waits up to
+    LOCK_WAIT_SECONDS for another writer, then raises CartBusy (409).
+    """
+    lock_key = f"{cache_key(cart_id(token))}:lock"
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    while not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            raise CartBusy()
+        time.sleep(LOCK_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        cache.delete(lock_key)
+
+
+def load(token):
+    """{product_id: (quantity, added_at)} for the token's cart (empty if unknown)."""
+    guest_id = cart_id(token)
+    return cache.get(cache_key(guest_id), {}) if guest_id else {}
+
+
+def save(token, lines):
+    cache.set(cache_key(cart_id(token)), lines, GUEST_CART_TIMEOUT)
+
+
+def apply_operations(lines, operations):
+    """Apply validated cart operations to guest `lines` in place."""
+    now = timezone.now()
+    for product, action in fold_operations(operations).items():
+        if action[0] == 'remove':
+            lines.pop(product, None)
+            continue
+        quantity, added_at = lines.get(product, (0, now))
+        quantity = action[1] if action[0] == 'set' else quantity + action[1]
+        lines[product] = (min(quantity, MAX_LINE_QUANTITY), added_at)
+    return lines
+
+
+def cart_rows(lines):
+    """
+    Unsaved Cart objects carrying the same annotations as views.cart_items,
+    so CartSerializer renders guest and user carts identically (one query).
+    """
+    products = Product.objects.select_related('primary_image').in_bulk(list(lines))
+    rows = []
+    for product_id, (quantity, added_at) in sorted(lines.items(), key=lambda line: line[1][1]):
+        product = products.get(product_id)
+        if product is None:  # deleted since it was added
+            continue
+        row = Cart(product=product, quantity=quantity, added_at=added_at)
+        row.line_total = product.price * quantity
+        row.out_of_stock = not product.is_active or product.stock_quantity < quantity
+        rows.append(row)
+    return rows
+
+
+def totals(rows):
+    subtotal = sum((row.line_total for row in rows), Decimal('0'))
+    return {
+        'item_count': sum(row.quantity for row in rows),
+        'subtotal': '{:f}'.format(subtotal.quantize(Decimal('0.01'))),
+        'has_out_of_stock': any(row.out_of_stock for row in rows),
+    }
+
+
+def merge_into_user_cart(user, token):
+    """
+    Move a guest cart into `user`'s Cart rows (quantities are added to lines
+    already there) with one batched upsert, then drop the cached copy.
+    """
+    if cart_id(token) is None:
+        return 0
+    try:
+        with locked(token):
+            lines = load(token)
+            if not lines:
+                return 0
+            available = set(
+                Product.objects.filter(pk__in=list(lines), is_active=True).values_list('pk', flat=True)
+            )
+            operations = [
+                {'product': product, 'op': 'add', 'quantity': min(quantity, MAX_LINE_QUANTITY)}
+                for product, (quantity, _) in lines.items()
+                if product in available and quantity > 0
+            ]
+            if operations:
+                apply_cart_operations(user, operations)
+            cache.delete(cache_key(cart_id(token)))
+    except CartBusy:
+        return 0  # never fail a login over it; the guest cart merges next time
+    return len(operations)
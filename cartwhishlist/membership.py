@@ -0,0 +1,34 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Cart, Wishlist
+
+# Which products a user has in their cart / wishlist, for drawing badges on
+# product grids. Both sets are cached together per user and dropped whenever
+# one of their Cart or Wishlist rows changes (see cartwhishlist.signals;
+# code that deletes Cart rows calls invalidate() itself).
+
+MEMBERSHIP_TIMEOUT = 60 * 60
+
+
+def cache_key(user_id):
+    return f"membership:{user_id}"
+
+
+def membership_sets(user):
+    """(cart product ids, wishlist product ids) for `user`; one query per table on a miss."""
+    key = cache_key(user.pk)
+    sets = cache.get(key)
+    if sets is None:
+        sets = (
+            frozenset(Cart.objects.filter(user=user).values_list('product_id', flat=True)),
+            frozenset(Wishlist.objects.filter(user=user).values_list('product_id', flat=True)),
+        )
+        cache.set(key, sets, MEMBERSHIP_TIMEOUT)
+    return sets
+
+
+def invalidate(user_id):
+    # Again after commit, in case a reader cached the old sets in between
+    cache.delete(cache_key(user_id))
+    transaction.on_commit(lambda: cache.delete(cache_key(user_id)))
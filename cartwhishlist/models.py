@@ -19,13 +19,13 @@ class Cart(models.Model):
 
     def get_product_image_url(self):
         """
-        Returns the selected product image URL, or falls back to the first image or a placeholder.
+        Returns the selected product image URL, or falls back to the product's cover image or a placeholder.
         """
         if self.image and self.image.image:
             return self.image.image.url
-        first_image = self.product.images.first()
-        if first_image and first_image.image:
-            return first_image.image.url
+        cover = self.product.primary_image
+        if cover and cover.image:
+            return cover.image.url
         return "/static/images/placeholder.png"
 
 
@@ -43,11 +43,11 @@ class Wishlist(models.Model):
 
     def get_product_image_url(self):
         """
-        Returns the selected product image URL, or falls back to the first image or a placeholder.
+        Returns the selected product image URL, or falls back to the product's cover image or a placeholder.
         """
         if self.image and self.image.image:
             return self.image.image.url
-        first_image = self.product.images.first()
-        if first_image and first_image.image:
-            return first_image.image.url
+        cover = self.product.primary_image
+        if cover and cover.image:
+            return cover.image.url
         return "/static/images/placeholder.png"
@@ -0,0 +1,72 @@
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.db.models.functions import Least
+
+from .membership import invalidate
+from .models import Cart
+
+# Batched cart mutations. Operations are folded per product first, so a batch
+# costs at most four statements however many entries it has: one DELETE, one
+# INSERT .. ON CONFLICT DO UPDATE for absolute quantities, and an
+# INSERT .. ON CONFLICT DO NOTHING plus one F()-based UPDATE for increments.
+# Increments are applied by the database, so concurrent adds never lose units.
+
+# Most units of one product per cart line. At the largest product price a
+# line total still fits the 12-digit line_total annotation.
+MAX_LINE_QUANTITY = 100
+
+
+def fold_operations(operations):
+    """
+    Reduce validated {product, op, quantity} dicts, in order, to one final
+    action per product: ('remove',), ('set', n) or ('add', n), with n at
+    most MAX_LINE_QUANTITY.
+    """
+    actions = {}
+    for operation in operations:
+        product, op, quantity = operation['product'], operation['op'], operation['quantity']
+        current = actions.get(product)
+        if op == 'remove' or (op == 'set' and quantity == 0):
+            actions[product] = ('remove',)
+        elif op == 'set':
+            actions[product] = ('set', quantity)
+        elif current is None:
+            actions[product] = ('add', quantity)
+        elif current[0] == 'remove':
+            actions[product] = ('set', quantity)
+        else:
+            actions[product] = (current[0], min(current[1] + quantity, MAX_LINE_QUANTITY))
+    return actions
+
+
+def apply_cart_operations(user, operations):
+    """Apply validated operations to `user`'s cart in one transaction."""
+    actions = fold_operations(operations)
+    removes = [product for product, action in actions.items() if action[0] == 'remove']
+    sets = {product: action[1] for product, action in actions.items() if action[0] == 'set'}
+    adds = {product: action[1] for product, action in actions.items() if action[0] == 'add'}
+
+    with transaction.atomic():
+        if removes:
+            Cart.objects.filter(user=user, product_id__in=removes).delete()
+        if sets:
+            Cart.objects.bulk_create(
+                [Cart(user=user, product_id=product, quantity=quantity) for product, quantity in sets.items()],
+                update_conflicts=True,
+                unique_fields=['user', 'product'],
+                update_fields=['quantity'],
+            )
+        if adds:
+            # Make sure every row exists, then increment them all in one statement
+            Cart.objects.bulk_create(
+                [Cart(user=user, product_id=product, quantity=0) for product in adds],
+                ignore_conflicts=True,
+            )
+            increment = Case(
+                *[When(product_id=product, then=Value(quantity)) for product, quantity in adds.items()],
+                output_field=PositiveIntegerField(),
+            )
+            Cart.objects.filter(user=user, product_id__in=adds).update(
+                quantity=Least(F('quantity') + increment, Value(MAX_LINE_QUANTITY))
+            )
+        invalidate(user.pk)
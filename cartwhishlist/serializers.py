@@ -1,18 +1,20 @@
 from rest_framework import serializers
 from .models import Cart, Wishlist
+from .operations import MAX_LINE_QUANTITY
 
 
 class ProductImageMixin:
     """
     Mixin to provide method for building absolute product image URL.
+    Expects rows loaded with select_related('product__primary_image').
     """
     def get_product_image(self, obj):
         request = self.context.get('request')
 
-        # Get the first related image from the product.images reverse relation
-        first_image = obj.product.images.first()
-        if first_image and first_image.image:
-            image_url = first_image.image.url
+        # The product's cover image (select_related by the views, no query per row)
+        cover = obj.product.primary_image
+        if cover and cover.image:
+            image_url = cover.image.url
             return request.build_absolute_uri(image_url) if request else image_url
 
         # Fallback placeholder
@@ -23,6 +25,9 @@ class CartSerializer(ProductImageMixin, serializers.ModelSerializer):
     product_name = serializers.ReadOnlyField(source='product.name')
     product_image = serializers.SerializerMethodField()
     product_price = serializers.ReadOnlyField(source='product.price')
+    # Annotated by views.cart_items
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    out_of_stock = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Cart
@@ -34,15 +39,19 @@ class CartSerializer(ProductImageMixin, serializers.ModelSerializer):
             'product_image',
             'product_price',
             'quantity',
+            'line_total',
+            'out_of_stock',
             'added_at',
         ]
         read_only_fields = ['user', 'added_at']
+        extra_kwargs = {'quantity': {'max_value': MAX_LINE_QUANTITY}}
 
 
 class WishlistSerializer(ProductImageMixin, serializers.ModelSerializer):
     product_name = serializers.ReadOnlyField(source='product.name')
     product_price = serializers.ReadOnlyField(source='product.price')
     product_image = serializers.SerializerMethodField()
+    out_of_stock = serializers.BooleanField(read_only=True)  # annotated by views.wishlist_items
 
     class Meta:
         model = Wishlist
@@ -53,6 +62,21 @@ class WishlistSerializer(ProductImageMixin, serializers.ModelSerializer):
             'product_name',
             'product_price',
             'product_image',
+            'out_of_stock',
             'added_at',
         ]
         read_only_fields = ['user', 'added_at']
+
+
+class CartOperationSerializer(serializers.Serializer):
+    """One entry of a /cart/batch/ request."""
+    OPS = ['set', 'add', 'remove']
+
+    product = serializers.IntegerField(min_value=1)
+    op = serializers.ChoiceField(choices=OPS, default='add')
+    quantity = serializers.IntegerField(min_value=0, max_value=MAX_LINE_QUANTITY, default=1)
+
+    def validate(self, attrs):
+        if attrs['op'] == 'add' and attrs['quantity'] < 1:
+            raise serializers.ValidationError({'quantity': "Must be at least 1 for 'add'."})
+        return attrs
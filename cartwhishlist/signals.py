@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .membership import invalidate
+from .models import Cart, Wishlist
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_save, sender=Wishlist)
+@receiver(post_delete, sender=Wishlist)
+def invalidate_membership(sender, instance, **kwargs):
+    # Bulk writes (cartwhishlist.operations) skip signals and invalidate themselves.
+    # Cart has no post_delete receiver on purpose: one would make every queryset
+    # .delete() of cart rows SELECT them first; deleters invalidate instead.
+    invalidate(instance.user_id)
@@ -1,3 +1,325 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from portalaccount.models import User
+from products.models import Product, ProductImage
+from . import guest
+from .models import Cart, Wishlist
+from .operations import MAX_LINE_QUANTITY
+
+
+class CartImageTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="buyer@example.com", password="pass", first_name="B", last_name="Uyer", role="customer"
+        )
+        self.client.force_authenticate(self.user)
+        for n in range(5):
+            product = Product.objects.create(name=f"Item {n}", description="", price="1.00", stock_quantity=1)
+            ProductImage.objects.create(product=product, image=f"product_images/item-{n}.jpg")
+            ProductImage.objects.create(product=product, image=f"product_images/item-{n}-back.jpg")
+            Cart.objects.create(user=self.user, product=product)
+            Wishlist.objects.create(user=self.user, product=product)
+
+    def test_lists_read_cover_without_per_row_queries(self):
+        for url in ('/cart/', '/wishlist/'):
+            with self.subTest(url=url):
+                with self.assertNumQueries(1 if url == '/wishlist/' else 2):  # + cart totals
+                    response = self.client.get(url)
+                items = response.data['items'] if url == '/cart/' else response.data
+                images = sorted(item['product_image'] for item in items)
+                self.assertEqual(images, [f"http://testserver/media/product_images/item-{n}.jpg" for n in range(5)])
+
+    def test_model_fallback_uses_cover(self):
+        item = Cart.objects.select_related('product__primary_image').first()
+        with self.assertNumQueries(0):
+            self.assertTrue(item.get_product_image_url().startswith('/media/product_images/item-'))
+
+
+class CartTotalsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="buyer@example.com", password="pass", first_name="B", last_name="Uyer", role="customer"
+        )
+        self.client.force_authenticate(self.user)
+
+    def fill(self, count):
+        Cart.objects.filter(user=self.user).delete()
+        for n in range(count):
+            product = Product.objects.create(
+                name=f"Item {count}-{n}", description="", price="2.50", stock_quantity=n % 3,
+            )
+            ProductImage.objects.create(product=product, image=f"product_images/{count}-{n}.jpg")
+            Cart.objects.create(user=self.user, product=product, quantity=2)
+
+    def test_constant_queries_and_totals(self):
+        for size in (1, 10, 50):
+            with self.subTest(size=size):
+                self.fill(size)
+                with self.assertNumQueries(2):  # rows + aggregate
+                    response = self.client.get('/cart/')
+                data = response.data
+                self.assertEqual(len(data['items']), size)
+                self.assertEqual(data['item_count'], size * 2)
+                self.assertEqual(data['subtotal'], '{:.2f}'.format(size * 5))
+                self.assertEqual(data['items'][0]['line_total'], '5.00')
+                # stock_quantity cycles 0, 1, 2 against a quantity of 2
+                flags = [item['out_of_stock'] for item in data['items']]
+                self.assertEqual(flags, [n % 3 < 2 for n in range(size)])
+                self.assertTrue(data['has_out_of_stock'])
+
+    def test_empty_cart_and_add(self):
+        response = self.client.get('/cart/')
+        self.assertEqual((response.data['item_count'], response.data['subtotal']), (0, '0.00'))
+        self.assertFalse(response.data['has_out_of_stock'])
+
+        product = Product.objects.create(name="Rice", description="", price="3.10", stock_quantity=9)
+        response = self.client.post('/cart/', {'product': product.pk, 'quantity': 3}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['product'], response.data['line_total']), (product.pk, '9.30'))
+        self.assertFalse(response.data['out_of_stock'])
+        self.assertEqual(self.client.get('/cart/').data['subtotal'], '9.30')
+
+    def test_wishlist_flags_unavailable_products(self):
+        for stock, active in ((0, True), (4, True), (4, False)):
+            product = Product.objects.create(
+                name="Item", description="", price="1.00", stock_quantity=stock, is_active=active,
+            )
+            Wishlist.objects.create(user=self.user, product=product)
+        with self.assertNumQueries(1):
+            response = self.client.get('/wishlist/')
+        self.assertEqual([item['out_of_stock'] for item in response.data], [True, False, True])
+
+
+class CartBatchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="buyer@example.com", password="pass", first_name="B", last_name="Uyer", role="customer"
+        )
+        self.client.force_authenticate(self.user)
+        self.products = [
+            Product.objects.create(name=f"Item {n}", description="", price="1.00", stock_quantity=10)
+            for n in range(4)
+        ]
+        a, b = self.products[:2]
+        Cart.objects.create(user=self.user, product=a, quantity=2)
+        Cart.objects.create(user=self.user, product=b, quantity=5)
+
+    def quantities(self):
+        return dict(Cart.objects.filter(user=self.user).values_list('product_id', 'quantity'))
+
+    def test_upserts_in_one_round_trip(self):
+        a, b, c, d = self.products
+        operations = [
+            {'product': a.pk, 'op': 'add', 'quantity': 3},   # existing line: incremented
+            {'product': c.pk, 'op': 'add'},                  # new line
+            {'product': c.pk, 'op': 'add', 'quantity': 2},
+            {'product': b.pk, 'op': 'remove'},
+            {'product': d.pk, 'op': 'set', 'quantity': 4},
+        ]
+        # product check, DELETE, upsert, insert-ignore, increment, then cart rows
+        # + totals (plus the transaction's savepoint pair)
+        with self.assertNumQueries(9):
+            response = self.client.post('/cart/batch/', operations, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {a.pk: 5, c.pk: 3, d.pk: 4})
+        self.assertEqual(response.data['item_count'], 12)
+
+    def test_set_overrides_and_zero_removes(self):
+        a, b, c, _ = self.products
+        self.client.post('/cart/batch/', {'operations': [
+            {'product': a.pk, 'op': 'set', 'quantity': 1},
+            {'product': a.pk, 'op': 'add', 'quantity': 1},
+            {'product': b.pk, 'op': 'set', 'quantity': 0},
+            {'product': c.pk, 'op': 'remove'},
+            {'product': c.pk, 'op': 'add', 'quantity': 7},
+        ]}, format='json')
+        self.assertEqual(self.quantities(), {a.pk: 2, c.pk: 7})
+
+    def test_invalid_batch_changes_nothing(self):
+        a = self.products[0]
+        a.is_active = False
+        a.save()
+        response = self.client.post('/cart/batch/', [
+            {'product': self.products[1].pk, 'op': 'add'},
+            {'product': a.pk, 'op': 'add'},
+            {'product': 999999, 'op': 'set', 'quantity': 1},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([bool(error) for error in response.data['operations']], [False, True, True])
+        self.assertEqual(self.quantities(), {a.pk: 2, self.products[1].pk: 5})
+
+        response = self.client.post('/cart/batch/', [{'product': a.pk, 'op': 'add', 'quantity': 0}], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_quantities_are_capped(self):
+        a, b, c, _ = self.products
+        for quantity in (MAX_LINE_QUANTITY + 1, 2 ** 31, 10 ** 20):
+            response = self.client.post('/cart/batch/', [{'product': c.pk, 'op': 'set', 'quantity': quantity}],
+                                        format='json')
+            self.assertEqual(response.status_code, 400)
+            response = self.client.post('/cart/', {'product': c.pk, 'quantity': quantity}, format='json')
+            self.assertEqual(response.status_code, 400)
+
+        # Repeated adds stop at the cap, within a batch and across requests
+        full = {'op': 'add', 'quantity': MAX_LINE_QUANTITY}
+        self.client.post('/cart/batch/', [{'product': b.pk, **full}, {'product': b.pk, **full}], format='json')
+        for _ in range(2):
+            response = self.client.post('/cart/batch/', [{'product': a.pk, **full}], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {a.pk: MAX_LINE_QUANTITY, b.pk: MAX_LINE_QUANTITY})
+        self.assertEqual(self.client.get('/cart/').status_code, 200)
+
+
+class GuestCartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.products = [
+            Product.objects.create(name=f"Item {n}", description="", price="2.00", stock_quantity=3)
+            for n in range(3)
+        ]
+        self.user = User.objects.create_user(
+            email="buyer@example.com", password="pass", first_name="B", last_name="Uyer", role="customer"
+        )
+
+    def test_guest_cart_lives_in_cache_only(self):
+        a, b, _ = self.products
+        # product check + product rows; nothing is written to the database
+        with self.assertNumQueries(2):
+            response = self.client.post('/cart/guest/', {'product': a.pk, 'quantity': 2}, format='json')
+        token = response['X-Cart-Token']
+        self.assertEqual(response.data['token'], token)
+        self.client.post('/cart/guest/', [{'product': a.pk, 'op': 'add'}, {'product': b.pk, 'op': 'add', 'quantity': 4}],
+                         format='json', HTTP_X_CART_TOKEN=token)
+        self.assertFalse(Cart.objects.exists())
+
+        response = self.client.get('/cart/guest/', HTTP_X_CART_TOKEN=token)
+        self.assertEqual(set(response.data), {'items', 'item_count', 'subtotal', 'has_out_of_stock', 'token'})
+        self.assertEqual([(item['product'], item['quantity']) for item in response.data['items']], [(a.pk, 3), (b.pk, 4)])
+        self.assertEqual(response.data['subtotal'], '14.00')
+        self.assertTrue(response.data['has_out_of_stock'])  # 4 wanted, 3 in stock
+
+        forged = self.client.get('/cart/guest/', HTTP_X_CART_TOKEN=token + 'x')
+        self.assertEqual((forged.data['items'], forged.data['token']), ([], None))
+
+    def test_login_merges_into_user_cart(self):
+        a, b, c = self.products
+        Cart.objects.create(user=self.user, product=a, quantity=1)
+        token = self.client.post('/cart/guest/', [
+            {'product': a.pk, 'op': 'add', 'quantity': 2},
+            {'product': b.pk, 'op': 'add'},
+        ], format='json')['X-Cart-Token']
+        c.is_active = False
+        c.save()
+
+        response = self.client.post('/login/', {'email': "buyer@example.com", 'password': "pass", 'cart_token': token},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        quantities = dict(Cart.objects.filter(user=self.user).values_list('product_id', 'quantity'))
+        self.assertEqual(quantities, {a.pk: 3, b.pk: 1})
+        # The guest copy is gone, so logging in again doesn't add it twice
+        self.client.post('/login/', {'email': "buyer@example.com", 'password': "pass"}, format='json',
+                         HTTP_X_CART_TOKEN=token)
+        self.assertEqual(Cart.objects.get(user=self.user, product=a).quantity, 3)
+
+
+    def test_concurrent_writes_are_serialized(self):
+        token = guest.new_token()
+        product = self.products[0].pk
+
+        def add_one(_):
+            with guest.locked(token):
+                lines = guest.apply_operations(guest.load(token), [{'product': product, 'op': 'add', 'quantity': 1}])
+                time.sleep(0.001)  # widen the read-modify-write window
+                guest.save(token, lines)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(add_one, range(40)))
+        self.assertEqual(guest.load(token)[product][0], 40)
+
+    def test_quantities_are_capped(self):
+        a, b = self.products[:2]
+        response = self.client.post('/cart/guest/', {'product': a.pk, 'quantity': 10 ** 20}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        full = {'product': a.pk, 'op': 'add', 'quantity': MAX_LINE_QUANTITY}
+        token = self.client.post('/cart/guest/', [full, full], format='json')['X-Cart-Token']
+        response = self.client.post('/cart/guest/', full, format='json', HTTP_X_CART_TOKEN=token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(guest.load(token)[a.pk][0], MAX_LINE_QUANTITY)
+
+        # Lines cached before the cap existed are clamped when merged
+        guest.save(token, {**guest.load(token), b.pk: (2 ** 31, timezone.now())})
+        Cart.objects.create(user=self.user, product=a, quantity=5)
+        guest.merge_into_user_cart(self.user, token)
+        quantities = dict(Cart.objects.filter(user=self.user).values_list('product_id', 'quantity'))
+        self.assertEqual(quantities, {a.pk: MAX_LINE_QUANTITY, b.pk: MAX_LINE_QUANTITY})
+
+    def test_busy_cart_is_a_conflict(self):
+        token = self.client.post('/cart/guest/', {'product': self.products[0].pk}, format='json')['X-Cart-Token']
+        with guest.locked(token), mock.patch('cartwhishlist.guest.LOCK_WAIT_SECONDS', 0):
+            response = self.client.post('/cart/guest/', {'product': self.products[1].pk}, format='json',
+                                        HTTP_X_CART_TOKEN=token)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(list(guest.load(token)), [self.products[0].pk])
+
+
+class MembershipTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="buyer@example.com", password="pass", first_name="B", last_name="Uyer", role="customer"
+        )
+        self.client.force_authenticate(self.user)
+        self.products = [
+            Product.objects.create(name=f"Item {n}", description="", price="1.00", stock_quantity=3)
+            for n in range(4)
+        ]
+        a, b, c, _ = self.products
+        Cart.objects.create(user=self.user, product=a)
+        Wishlist.objects.create(user=self.user, product=b)
+        Wishlist.objects.create(user=self.user, product=c)
+
+    def lookup(self):
+        ids = ','.join(str(product.pk) for product in self.products)
+        return self.client.get('/membership/', {'ids': ids}).data
+
+    def test_flags_from_cached_sets(self):
+        a, b, c, d = self.products
+        with self.assertNumQueries(2):  # one per table
+            data = self.lookup()
+        self.assertEqual(data, {'in_cart': [a.pk], 'in_wishlist': [b.pk, c.pk]})
+        with self.assertNumQueries(0):
+            self.lookup()
+
+    def test_writes_invalidate(self):
+        a, b, c, d = self.products
+        self.lookup()
+        Wishlist.objects.filter(user=self.user, product=b).first().delete()
+        self.assertEqual(self.lookup()['in_wishlist'], [c.pk])
+
+        self.client.post('/cart/batch/', [{'product': d.pk, 'op': 'add'}, {'product': a.pk, 'op': 'remove'}],
+                         format='json')
+        self.assertEqual(self.lookup()['in_cart'], [d.pk])
+
+        self.assertEqual(self.client.get('/membership/', {'ids': '1,x'}).status_code, 400)
 
-# Create your tests here.
+    def test_removing_and_checking_out_invalidate(self):
+        a, _, _, d = self.products
+        Cart.objects.create(user=self.user, product=d)
+        self.lookup()
+        self.client.delete(f'/cart/{Cart.objects.get(product=a).pk}/')
+        self.assertEqual(self.lookup()['in_cart'], [d.pk])
+        self.assertEqual(self.client.post('/checkout/').status_code, 201)
+        self.assertEqual(self.lookup()['in_cart'], [])
@@ -1,16 +1,22 @@
 # urls.py
 from django.urls import path
 from .views import (
-    CartListCreateView, CartDeleteView,
-    WishlistListCreateView, WishlistDeleteView
+    CartListCreateView, CartDeleteView, CartBatchView, GuestCartView,
+    WishlistListCreateView, WishlistDeleteView,
+    MembershipView,
 )
 
 urlpatterns = [
     # 🛒 Cart
     path('cart/', CartListCreateView.as_view(), name='cart-list-create'),
+    path('cart/batch/', CartBatchView.as_view(), name='cart-batch'),
+    path('cart/guest/', GuestCartView.as_view(), name='cart-guest'),
     path('cart/<int:pk>/', CartDeleteView.as_view(), name='cart-delete'),
 
     # ❤️ Wishlist
     path('wishlist/', WishlistListCreateView.as_view(), name='wishlist-list-create'),
     path('wishlist/<int:pk>/', WishlistDeleteView.as_view(), name='wishlist-delete'),
+
+    # 🏷️ Cart/wishlist membership for product grids
+    path('membership/', MembershipView.as_view(), name='membership'),
 ]
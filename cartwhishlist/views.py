@@ -1,35 +1,197 @@
+from decimal import Decimal
+
+from django.db.models import (
+    BooleanField, Case, Count, DecimalField, ExpressionWrapper, F, Q, Sum, Value, When
+)
 from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 
+from products.models import Product
+from . import guest
+from .membership import invalidate, membership_sets
 from .models import Cart, Wishlist
-from .serializers import CartSerializer, WishlistSerializer
+from .operations import apply_cart_operations
+from .serializers import CartOperationSerializer, CartSerializer, WishlistSerializer
+
+MAX_CART_OPERATIONS = 100
+MAX_MEMBERSHIP_IDS = 200
+
+LINE_TOTAL = ExpressionWrapper(
+    F('quantity') * F('product__price'),
+    output_field=DecimalField(max_digits=12, decimal_places=2),
+)
+
+
+def out_of_stock_condition(wanted):
+    # Hidden from the shop, or fewer units left than the row asks for
+    return Q(product__is_active=False) | Q(product__stock_quantity__lt=wanted)
+
+
+def out_of_stock(wanted):
+    return Case(
+        When(out_of_stock_condition(wanted), then=Value(True)),
+        default=Value(False),
+        output_field=BooleanField(),
+    )
+
+
+def cart_items(user):
+    """A user's cart rows with product, cover, line total and stock flag in one query."""
+    return (
+        Cart.objects.filter(user=user)
+        .select_related('product__primary_image')
+        .annotate(line_total=LINE_TOTAL, out_of_stock=out_of_stock(F('quantity')))
+        .order_by('added_at', 'id')
+    )
+
+
+def wishlist_items(user):
+    return (
+        Wishlist.objects.filter(user=user)
+        .select_related('product__primary_image')
+        .annotate(out_of_stock=out_of_stock(1))
+        .order_by('added_at', 'id')
+    )
+
+
+def cart_response(request):
+    """The cart rows plus totals aggregated by the database (two queries, any cart size)."""
+    items = cart_items(request.user)
+    serializer = CartSerializer(items, many=True, context={'request': request})
+    totals = Cart.objects.filter(user=request.user).aggregate(
+        subtotal=Sum(LINE_TOTAL),
+        item_count=Sum('quantity'),
+        out_of_stock_count=Count('id', filter=out_of_stock_condition(F('quantity'))),
+    )
+    return Response({
+        'items': serializer.data,
+        'item_count': totals['item_count'] or 0,
+        'subtotal': '{:f}'.format((totals['subtotal'] or Decimal('0')).quantize(Decimal('0.01'))),
+        'has_out_of_stock': bool(totals['out_of_stock_count']),
+    })
+
+
+def validate_operations(data):
+    """
+    Validate a list of cart operations (or {"operations": [...]}, or a single
+    operation). Returns (operations, None) or (None, error Response).
+    """
+    if isinstance(data, dict):
+        data = data['operations'] if 'operations' in data else [data]
+    if not isinstance(data, list) or not data:
+        return None, Response({'detail': 'Send a non-empty list of operations.'},
+                              status=status.HTTP_400_BAD_REQUEST)
+    if len(data) > MAX_CART_OPERATIONS:
+        return None, Response({'detail': f'At most {MAX_CART_OPERATIONS} operations per request.'},
+                              status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = CartOperationSerializer(data=data, many=True)
+    if not serializer.is_valid():
+        return None, Response({'operations': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+    operations = serializer.validated_data
+
+    # One query to check every product that is being put into the cart
+    wanted = {op['product'] for op in operations if op['op'] != 'remove'}
+    available = set(Product.objects.filter(pk__in=wanted, is_active=True).values_list('pk', flat=True))
+    errors = [
+        {'product': [f"Product {op['product']} is not available."]}
+        if op['op'] != 'remove' and op['product'] not in available else {}
+        for op in operations
+    ]
+    if any(errors):
+        return None, Response({'operations': errors}, status=status.HTTP_400_BAD_REQUEST)
+    return operations, None
 
 
 # 🛒 CART VIEWS
 class CartListCreateView(APIView):
+    """
+    GET: The cart as {items, item_count, subtotal, has_out_of_stock}; each
+    item carries its line_total and an out_of_stock flag.
+    POST: Add a product; responds with the created item.
+    """
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        cart_items = Cart.objects.filter(user=request.user)
-        serializer = CartSerializer(cart_items, many=True, context={'request': request})
-        return Response(serializer.data)
+        return cart_response(request)
 
     def post(self, request):
         serializer = CartSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            serializer.save(user=request.user)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            item = serializer.save(user=request.user)
+            item = cart_items(request.user).get(pk=item.pk)
+            return Response(CartSerializer(item, context={'request': request}).data,
+                            status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class CartBatchView(APIView):
+    """
+    POST: Apply a list of {product, op: set|add|remove, quantity} operations
+    (or {"operations": [...]}) atomically and return the updated cart.
+    'add' increments an existing line instead of failing on the unique
+    (user, product) constraint; 'set' with quantity 0 removes the line.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        operations, error = validate_operations(request.data)
+        if error is not None:
+            return error
+        apply_cart_operations(request.user, operations)
+        return cart_response(request)
+
+
+class GuestCartView(APIView):
+    """
+    Cart for visitors who aren't logged in, kept in the cache (NO authentication).
+    GET: Same shape as /cart/, plus the cart `token` (send it back as X-Cart-Token).
+    POST: Cart operations as for /cart/batch/ (a single {product, quantity}
+    adds); a token is issued on the first write. Login/signup with the
+    token merges the lines into the user's cart.
+    """
+    authentication_classes = []  # Disable global authentication
+    permission_classes = [permissions.AllowAny]
+
+    def render(self, request, token, lines):
+        rows = guest.cart_rows(lines)
+        serializer = CartSerializer(rows, many=True, context={'request': request})
+        response = Response({'items': serializer.data, **guest.totals(rows), 'token': token})
+        if token:
+            response['X-Cart-Token'] = token
+        return response
+
+    def get(self, request):
+        token = guest.request_token(request)
+        if guest.cart_id(token) is None:
+            return self.render(request, None, {})
+        return self.render(request, token, guest.load(token))
+
+    def post(self, request):
+        operations, error = validate_operations(request.data)
+        if error is not None:
+            return error
+        token = guest.request_token(request)
+        if guest.cart_id(token) is None:
+            token = guest.new_token()
+        with guest.locked(token):
+            lines = guest.apply_operations(guest.load(token), operations)
+            if len(lines) > guest.MAX_GUEST_LINES:
+                return Response({'detail': f'A guest cart holds at most {guest.MAX_GUEST_LINES} products.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            guest.save(token, lines)
+        return self.render(request, token, lines)
+
+
 class CartDeleteView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def delete(self, request, pk):
         cart_item = get_object_or_404(Cart, id=pk, user=request.user)
         cart_item.delete()
+        invalidate(request.user.pk)
         return Response({'detail': 'Item removed from cart'}, status=status.HTTP_204_NO_CONTENT)
 
 
@@ -38,15 +200,16 @@ class WishlistListCreateView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        wishlist_items = Wishlist.objects.filter(user=request.user)
-        serializer = WishlistSerializer(wishlist_items, many=True, context={'request': request})
+        serializer = WishlistSerializer(wishlist_items(request.user), many=True, context={'request': request})
         return Response(serializer.data)
 
     def post(self, request):
         serializer = WishlistSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            serializer.save(user=request.user)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            item = serializer.save(user=request.user)
+            item = wishlist_items(request.user).get(pk=item.pk)
+            return Response(WishlistSerializer(item, context={'request': request}).data,
+                            status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -57,3 +220,29 @@ class WishlistDeleteView(APIView):
         wishlist_item = get_object_or_404(Wishlist, id=pk, user=request.user)
         wishlist_item.delete()
         return Response({'detail': 'Item removed from wishlist'}, status=status.HTTP_204_NO_CONTENT)
+
+
+# 🏷️ MEMBERSHIP (badges on product grids)
+class MembershipView(APIView):
+    """
+    GET ?ids=1,2,3: Which of these products are in the user's cart and
+    wishlist, as {"in_cart": [...], "in_wishlist": [...]}. Served from a
+    per-user cache, so a grid page costs no queries once warm.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            ids = [int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()]
+        except ValueError:
+            return Response({'detail': "'ids' must be a comma-separated list of product ids."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > MAX_MEMBERSHIP_IDS:
+            return Response({'detail': f'At most {MAX_MEMBERSHIP_IDS} ids per request.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        in_cart, in_wishlist = membership_sets(request.user)
+        return Response({
+            'in_cart': [pk for pk in ids if pk in in_cart],
+            'in_wishlist': [pk for pk in ids if pk in in_wishlist],
+        })
@@ -33,6 +33,7 @@ INSTALLED_APPS = [
     # Third-party apps
     'corsheaders',  # CORS support for frontend
     'rest_framework',  # Django REST Framework
+    'django_filters',  # Product list filtering
     'rest_framework_simplejwt.token_blacklist',  # JWT token blacklist
     'whitenoise.runserver_nostatic',  # Handle static files in dev
 ]
@@ -79,6 +80,20 @@ DATABASES = {
     )
 }
 
+# CACHE (locmem by default; point CACHE_BACKEND/CACHE_LOCATION at a shared
+# backend such as FileBasedCache or Redis so gunicorn workers share entries)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'malonda'),
+    }
+}
+
+# Lifetime of a rendered catalog snapshot; new versions replace it on any write anyway
+CATALOG_SNAPSHOT_TIMEOUT = int(os.getenv('CATALOG_SNAPSHOT_TIMEOUT', 60 * 60))
+# Idle lifetime of a guest (not logged in) cart held in the cache
+GUEST_CART_TIMEOUT = int(os.getenv('GUEST_CART_TIMEOUT', 60 * 60 * 24 * 7))
+
 # STATIC & MEDIA FILES
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
@@ -87,6 +102,14 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Spool every upload to a temp file (bounded memory) and hash it while streaming
+FILE_UPLOAD_HANDLERS = ['products.storage.HashingUploadHandler']
+
+# Widths (px) of the resized WebP/JPEG copies generated for each product image
+PRODUCT_IMAGE_WIDTHS = [160, 480, 1024]
+# Images per product create/update request; processing happens in `manage.py process_image_jobs`
+PRODUCT_MAX_UPLOADED_IMAGES = 10
+
 # DEFAULT PRIMARY KEY FIELD
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -106,6 +129,21 @@ REST_FRAMEWORK = {
     )
 }
 
+# Product list pagination (clients may override with ?page_size=, up to the max)
+PRODUCT_PAGE_SIZE = int(os.getenv('PRODUCT_PAGE_SIZE', 24))
+PRODUCT_MAX_PAGE_SIZE = int(os.getenv('PRODUCT_MAX_PAGE_SIZE', 100))
+# Lower bounds (MWK) of the price facet buckets; the last bucket is open-ended
+PRODUCT_PRICE_BUCKETS = ['0', '1000', '5000', '10000', '50000']
+# Build product/category list payloads from .values() and render with orjson
+# (same bytes as the DRF serializers; see products/fastpath.py)
+PRODUCT_FAST_SERIALIZATION = os.getenv('PRODUCT_FAST_SERIALIZATION', 'False') == 'True'
+
+# Idempotency-Key handling for POST /orders/, /checkout/ and /payments/initiate/
+# (see orderediterm/idempotency.py): how long a response is replayed, and how
+# long a duplicate waits for the first request to finish before getting a 409
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 60 * 60 * 24))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv('IDEMPOTENCY_WAIT_TIMEOUT', 10))
+
 # JWT TOKEN LIFETIME SETTINGS
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),  # 1 hour
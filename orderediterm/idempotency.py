@@ -0,0 +1,125 @@
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+# Idempotency-Key support for POST handlers. The first request with a key
+# claims an IdempotencyKey row (committed straight away, so others see it),
+# runs, and stores its status and body. A retry with the same key gets that
+# response replayed instead of running again; a retry that arrives while the
+# first request is still running polls the row until it's done. Claims left
+# behind by a crashed worker expire after CLAIM_TIMEOUT.
+
+KEY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+KEY_TTL = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 60 * 60 * 24))
+WAIT_TIMEOUT = getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 10)
+CLAIM_TIMEOUT = timedelta(seconds=60)
+POLL_INTERVAL = 0.05
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def request_hash(request):
+    """Fingerprint of the method, path and parsed body."""
+    data = request.data
+    if hasattr(data, 'lists'):  # QueryDict
+        data = dict(data.lists())
+    body = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode('utf-8')).hexdigest()
+
+
+def claim(user, key, fingerprint):
+    """
+    (record, True) if this request now owns `key`; otherwise (record, False)
+    once the owner has finished or WAIT_TIMEOUT has passed.
+    """
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while True:
+        now = timezone.now()
+        IdempotencyKey.objects.filter(user=user, key=key, expires_at__lte=now).delete()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user, key=key, request_hash=fingerprint, expires_at=now + CLAIM_TIMEOUT,
+                )
+            return record, True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        # A different request under the same key is answered straight away
+        if record is not None and (
+            record.status_code is not None
+            or record.request_hash != fingerprint
+            or time.monotonic() >= deadline
+        ):
+            return record, False
+        time.sleep(POLL_INTERVAL)  # still in flight (or just released): look again
+
+
+def replay(record, fingerprint):
+    if record.request_hash != fingerprint:
+        return Response(
+            {'detail': 'This Idempotency-Key was already used for a different request.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if record.status_code is None:
+        return Response(
+            {'detail': 'A request with this Idempotency-Key is still in progress.'},
+            status=status.HTTP_409_CONFLICT,
+        )
+    return Response(record.response_body, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(handler):
+    """
+    Decorate an APIView `post` so an `Idempotency-Key` header makes retries
+    safe. Keys are per user; anonymous requests and requests without the
+    header run as usual. Error responses from APIExceptions are stored like
+    any other, but 5xx responses and unexpected exceptions release the key
+    so the client can retry for real.
+    """
+    @functools.wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.META.get(KEY_HEADER)
+        if not key or not request.user.is_authenticated:
+            return handler(view, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'detail': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = request_hash(request)
+        record, owner = claim(request.user, key, fingerprint)
+        if not owner:
+            return replay(record, fingerprint)
+
+        try:
+            try:
+                response = handler(view, request, *args, **kwargs)
+            except APIException as exc:
+                response = view.handle_exception(exc)
+        except BaseException:
+            record.delete()
+            raise
+        if response.status_code >= 500:
+            record.delete()
+            return response
+
+        IdempotencyKey.objects.filter(pk=record.pk).update(
+            status_code=response.status_code,
+            # Through DRF's encoder, so the replay renders exactly like the original
+            response_body=json.loads(json.dumps(response.data, cls=JSONEncoder)),
+            expires_at=timezone.now() + KEY_TTL,
+        )
+        return response
+    return wrapper
@@ -0,0 +1,110 @@
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from portalaccount.models import User
+from products.models import Product
+from orderediterm.models import Order
+from orderediterm.placement import InsufficientStock, place_order
+
+# SQLite reports lock contention as OperationalError instead of waiting like
+# PostgreSQL does; those attempts are retried (and counted) so the harness
+# also runs against a development database.
+LOCK_RETRIES = 200
+
+
+def attempt(user, product_id, quantity):
+    """Place one order; returns ('placed' | 'rejected', lock retries)."""
+    retries = 0
+    try:
+        while True:
+            try:
+                place_order(user, [{'product_id': product_id, 'quantity': quantity}])
+                return 'placed', retries
+            except InsufficientStock:
+                return 'rejected', retries
+            except OperationalError:
+                retries += 1
+                if retries > LOCK_RETRIES:
+                    raise
+                time.sleep(random.uniform(0, 0.002 * min(retries, 20)))
+    finally:
+        connection.close()  # each worker thread has its own connection
+
+
+def hammer(product, users, orders, threads, quantity=1):
+    """
+    Fire `orders` single-line orders for `product` from `threads` threads,
+    round-robin over `users`. Returns counts and timings; raises
+    CommandError if stock was oversold or doesn't add up.
+    """
+    start_stock = Product.objects.get(pk=product.pk).stock_quantity
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(
+            lambda n: attempt(users[n % len(users)], product.pk, quantity), range(orders)
+        ))
+    elapsed = time.perf_counter() - start
+
+    placed = sum(1 for outcome, _ in results if outcome == 'placed')
+    remaining = Product.objects.get(pk=product.pk).stock_quantity
+    recorded = Order.objects.filter(items__product=product).count()
+    if remaining < 0 or start_stock - remaining != placed * quantity or recorded != placed:
+        raise CommandError(
+            f"Stock mismatch: started with {start_stock}, {remaining} left, "
+            f"{placed} orders placed, {recorded} recorded."
+        )
+    return {
+        'placed': placed,
+        'rejected': orders - placed,
+        'remaining': remaining,
+        'lock_retries': sum(retries for _, retries in results),
+        'seconds': elapsed,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer one hot product with parallel orders and check that stock is never "
+        "oversold. Creates its own product and customers and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=500, help='Orders to attempt.')
+        parser.add_argument('--threads', type=int, default=32, help='Parallel workers.')
+        parser.add_argument('--stock', type=int, default=200, help='Starting stock of the hot product.')
+        parser.add_argument('--quantity', type=int, default=1, help='Units per order.')
+        parser.add_argument('--users', type=int, default=8, help='Distinct customers placing orders.')
+
+    def handle(self, *args, **options):
+        if min(options['orders'], options['threads'], options['quantity'], options['users']) < 1:
+            raise CommandError("--orders, --threads, --quantity and --users must be positive.")
+        run = uuid.uuid4().hex[:8]
+        product = Product.objects.create(
+            name=f"Stress {run}", description="", price="1.00",
+            stock_quantity=options['stock'], sku=f"STRESS-{run}",
+        )
+        users = [
+            User.objects.create_user(
+                email=f"stress-{run}-{n}@example.com", password=None,
+                first_name="Stress", last_name=str(n), role="customer",
+            )
+            for n in range(options['users'])
+        ]
+        try:
+            result = hammer(product, users, options['orders'], options['threads'], options['quantity'])
+        finally:
+            Order.objects.filter(user__in=users).delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            product.delete()
+
+        self.stdout.write(
+            f"{result['placed']} placed, {result['rejected']} rejected, {result['remaining']} left, "
+            f"0 oversold; {options['orders'] / result['seconds']:.0f} orders/s "
+            f"({result['seconds']:.2f}s, {options['threads']} threads, "
+            f"{result['lock_retries']} lock retries)"
+        )
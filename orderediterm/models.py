@@ -1,7 +1,29 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
 from products.models import Product
 
+
+LINE_TOTAL = ExpressionWrapper(
+    F('quantity') * F('price'), output_field=DecimalField(max_digits=12, decimal_places=2)
+)
+
+
+def item_total(order_ref):
+    """Subquery: the summed line totals of the order `order_ref` points at."""
+    return (
+        OrderItem.objects.filter(order=order_ref)
+        .order_by()
+        .values('order')
+        .annotate(total=Sum(LINE_TOTAL))
+        .values('total')
+    )
+
+
 class Order(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -19,27 +41,39 @@ class Order(models.Model):
         related_name='orders'
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
 
+    class Meta:
+        indexes = [
+            # Back the keyset-paginated manager list (newest first) and its filters
+            models.Index(fields=['-created_at', '-id'], name='order_created_id_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='order_status_created_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} - {self.user.email}"
 
     def calculate_total(self):
-        return sum(item.quantity * item.price for item in self.items.all())
+        """Sum of the items' price snapshots, computed by the database."""
+        total = self.items.aggregate(total=Sum(LINE_TOTAL))['total']
+        return total or Decimal('0.00')
+
+    def refresh_total(self):
+        """Recompute total_price in one UPDATE (after editing items one by one)."""
+        Order.objects.filter(pk=self.pk).update(
+            total_price=Coalesce(Subquery(item_total(OuterRef('pk'))), Value(Decimal('0.00'))),
+            updated_at=timezone.now(),
+        )
 
     def save(self, *args, **kwargs):
-        # On first save, save to get pk
-        if not self.pk:
-            super().save(*args, **kwargs)
-        # Update total_price after related items exist
-        new_total = self.calculate_total()
-        if self.total_price != new_total:
-            self.total_price = new_total
-            super().save(update_fields=['total_price'])
-        else:
-            # If total hasn't changed, no need to save again
-            super().save(*args, **kwargs)
+        # Partial saves (e.g. mark_as_paid) must still move updated_at. The
+        # total is set by whoever writes the items (see orderediterm.placement).
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'updated_at'}
+        super().save(*args, **kwargs)
 
     def mark_as_paid(self):
         self.status = 'paid'
@@ -73,6 +107,28 @@ class OrderItem(models.Model):
         if self.product and not self.price:
             self.price = self.product.price
         super().save(*args, **kwargs)
-        # After saving an item, update the order total_price
-        if self.order:
-            self.order.save(update_fields=['total_price'])
+        # Keep the order total in step for one-off edits; bulk placement
+        # (bulk_create) skips this and sets the total once.
+        self.order.refresh_total()
+
+
+class IdempotencyKey(models.Model):
+    """
+    A client's Idempotency-Key and the response its first request got, so
+    retries are replayed instead of re-run (see orderediterm.idempotency).
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)  # method, path and body of the first request
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # null while in flight
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_key_user_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.status_code or 'in flight'})"
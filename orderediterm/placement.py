@@ -0,0 +1,144 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from cartwhishlist.membership import invalidate as invalidate_membership
+from cartwhishlist.models import Cart
+from products.models import CatalogVersion, Product
+from .models import Order, OrderItem
+
+# Order placement as one pipeline: fetch every product in one query, reserve
+# stock, compute the total once in Python, insert the order with that total,
+# then insert all lines with a single bulk_create. Nothing is recomputed per
+# line.
+#
+# Stock is reserved with one conditional UPDATE per distinct product
+# (`stock = stock - q WHERE stock >= q`) instead of SELECT .. FOR UPDATE:
+# the row lock is only held from the UPDATE to the commit, and the database
+# does the check, so concurrent buyers can't oversell. Products are updated
+# in primary-key order so two orders sharing products always lock them in
+# the same order and can't deadlock.
+
+
+class InsufficientStock(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Not enough stock for some items.'
+    default_code = 'insufficient_stock'
+
+    def __init__(self, shortfall):
+        super().__init__()
+        # Set directly so the numbers in the report stay numbers
+        self.detail = {'detail': self.default_detail, 'shortfall': shortfall}
+
+
+class StockShortfall(Exception):
+    def __init__(self, product_id):
+        super().__init__(product_id)
+        self.product_id = product_id
+
+
+def requested_quantities(items):
+    """{product_id: total quantity} (a product may appear on several lines)."""
+    quantities = {}
+    for item in items:
+        quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+    return quantities
+
+
+def reserve_stock(quantities):
+    """
+    Take `quantities` out of stock, product by product in pk order. Raises
+    StockShortfall at the first product without enough stock; the caller's
+    transaction must roll back the decrements already made.
+    """
+    now = timezone.now()
+    for product_id in sorted(quantities):
+        wanted = quantities[product_id]
+        reserved = Product.objects.filter(pk=product_id, stock_quantity__gte=wanted).update(
+            stock_quantity=F('stock_quantity') - wanted,
+            updated_at=now,
+        )
+        if not reserved:
+            raise StockShortfall(product_id)
+    # .update() skips the signals; cached catalog lists show stock, so retire
+    # them once the order commits (one bump per transaction, not per row)
+    CatalogVersion.bump_on_commit()
+
+
+def shortfall_report(quantities, failed_id):
+    """[{'product', 'requested', 'available'}, ...] for every line that can't be filled now."""
+    available = dict(
+        Product.objects.filter(pk__in=list(quantities)).values_list('pk', 'stock_quantity')
+    )
+    return [
+        {'product': product_id, 'requested': wanted, 'available': available.get(product_id, 0)}
+        for product_id, wanted in sorted(quantities.items())
+        if available.get(product_id, 0) < wanted or product_id == failed_id
+    ]
+
+
+def place_order(user, items):
+    """
+    Create an order for `user` from [{'product_id', 'quantity'}, ...] with
+    prices snapshotted from the products, taking the quantities out of stock.
+    Raises ValidationError if a product doesn't exist or isn't for sale and
+    InsufficientStock (409) if stock runs short; nothing is written then.
+    """
+    quantities = requested_quantities(items)
+    try:
+        with transaction.atomic():
+            # Covers come along so the serialized order needs no query per line
+            products = Product.objects.select_related('primary_image').in_bulk(list(quantities))
+            errors = [
+                {} if item['product_id'] in products and products[item['product_id']].is_active
+                else {'product': [f"Product {item['product_id']} is not available."]}
+                for item in items
+            ]
+            if any(errors):
+                raise ValidationError({'items': errors})
+
+            reserve_stock(quantities)
+
+            lines = [
+                OrderItem(
+                    product=products[item['product_id']],
+                    quantity=item['quantity'],
+                    price=products[item['product_id']].price,
+                )
+                for item in items
+            ]
+            order = Order.objects.create(
+                user=user,
+                total_price=sum(line.price * line.quantity for line in lines),
+            )
+            for line in lines:
+                line.order = order
+            OrderItem.objects.bulk_create(lines)
+    except StockShortfall as shortfall:
+        # Rolled back by now, so the report shows what's really left
+        raise InsufficientStock(shortfall_report(quantities, shortfall.product_id))
+
+    # The caller usually serializes the order next; hand it the lines we have
+    order._prefetched_objects_cache = {'items': lines}
+    return order
+
+
+def checkout_cart(user):
+    """
+    Turn `user`'s cart into an order (see place_order) and empty the cart,
+    all in one transaction. Raises ValidationError if the cart is empty.
+    """
+    with transaction.atomic():
+        # Locking the user's own cart rows stops a double-submitted checkout
+        # from ordering the same cart twice; other users never wait on them.
+        cart = Cart.objects.select_for_update().filter(user=user).order_by('added_at', 'id')
+        items = [{'product_id': product_id, 'quantity': quantity}
+                 for product_id, quantity in cart.values_list('product_id', 'quantity')]
+        if not items:
+            raise ValidationError({'cart': ['Your cart is empty.']})
+        order = place_order(user, items)
+        Cart.objects.filter(user=user).delete()
+        invalidate_membership(user.pk)
+    return order
@@ -1,9 +1,13 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
+from products.serializers import EagerLoadingMixin
 from .models import Order, OrderItem
-from products.models import Product
+from .placement import place_order
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
+    # Plain id both ways: no per-line lookup while validating (see placement.place_order)
+    product = serializers.IntegerField(source='product_id', min_value=1, max_value=2 ** 63 - 1)  # BigAutoField range
     product_name = serializers.ReadOnlyField(source='product.name')
     product_image = serializers.SerializerMethodField()
     product_price = serializers.ReadOnlyField(source='product.price')
@@ -22,16 +26,20 @@ class OrderItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['price', 'product_name', 'product_image', 'product_price']
 
     def get_product_image(self, obj):
+        # The product's cover image, loaded by OrderSerializer.setup_eager_loading
         request = self.context.get('request')
-        image_url = ''
-        if obj.product and getattr(obj.product, 'image', None):
-            image_url = obj.product.image.url
-        if request and image_url:
-            return request.build_absolute_uri(image_url)
-        return image_url
+        cover = obj.product.primary_image if obj.product else None
+        if not cover or not cover.image:
+            return ''
+        return request.build_absolute_uri(cover.image.url) if request else cover.image.url
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ['user']
+    prefetch_related_fields = [
+        Prefetch('items', queryset=OrderItem.objects.select_related('product__primary_image').order_by('id')),
+    ]
+
     items = OrderItemSerializer(many=True)
     user_email = serializers.ReadOnlyField(source='user.email')
 
@@ -57,34 +65,14 @@ class OrderSerializer(serializers.ModelSerializer):
         return value
 
     def create(self, validated_data):
-        items_data = validated_data.pop('items')
         request = self.context.get('request')
         user = request.user if request else None
+        return place_order(user, validated_data['items'])
 
-        # Create the order linked to the current user
-        order = Order.objects.create(user=user)
-
-        total = 0
-        for item_data in items_data:
-            product = item_data['product']
-            quantity = item_data['quantity']
-            price = product.price  # snapshot price
-
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=quantity,
-                price=price
-            )
-            total += price * quantity
-
-        order.total_price = total
-        order.save()
-
-        return order
 
+class RecentOrderSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ['user']
 
-class RecentOrderSerializer(serializers.ModelSerializer):
     customer = serializers.SerializerMethodField()
     amount = serializers.DecimalField(source='total_price', max_digits=10, decimal_places=2)
 
@@ -1,3 +1,411 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from cartwhishlist.models import Cart
+from portalaccount.models import User
+from products.models import CatalogVersion, Category, Product, ProductImage
+from .management.commands.stress_checkout import hammer
+from .models import IdempotencyKey, Order, OrderItem
+
+
+class OrderConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="buyer@example.com", password="pass", first_name="B", last_name="Uyer", role="customer"
+        )
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name="Grains")
+        self.product = Product.objects.create(
+            name="Rice", description="", price="10.00", stock_quantity=5, category=category,
+        )
+        self.order = Order(user=self.user)
+        self.order.save()
+        OrderItem.objects.create(order=self.order, product=self.product, quantity=2, price="10.00")
+
+    def test_order_list_and_detail_revalidate(self):
+        for url in ['/orders/', f'/orders/{self.order.pk}/']:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_status_and_product_changes_invalidate(self):
+        etag = self.client.get('/orders/')['ETag']
+        self.order.mark_as_paid()
+        response = self.client.get('/orders/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        self.product.price = "12.00"
+        self.product.save()
+        self.assertEqual(self.client.get('/orders/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_other_users_order_is_not_validated(self):
+        other = User.objects.create_user(
+            email="other@example.com", password="pass", first_name="O", last_name="Ther", role="customer"
+        )
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(f'/orders/{self.order.pk}/').status_code, 404)
+
+
+class OrderCreateTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="bulk@example.com", password="pass", first_name="B", last_name="Ulk", role="customer"
+        )
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name="Pantry")
+        self.products = Product.objects.bulk_create([
+            Product(name=f"Item {i}", description="", price=f"{i + 1}.50", stock_quantity=10,
+                    category=category, sku=f"BULK-{i}")
+            for i in range(50)
+        ])
+
+    def place(self, products):
+        items = [{'product': product.pk, 'quantity': 2} for product in products]
+        return self.client.post('/orders/', {'items': items}, format='json')
+
+    def test_query_count_only_grows_by_stock_updates(self):
+        with self.assertNumQueries(6) as one_line:
+            self.place(self.products[:1])
+        # One conditional stock UPDATE per extra product, nothing else per line
+        with self.assertNumQueries(len(one_line.captured_queries) + 49):
+            response = self.place(self.products)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['items']), 50)
+        expected = sum(2 * (i + 1.5) for i in range(50))
+        self.assertEqual(float(response.data['total_price']), expected)
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(order.total_price, order.calculate_total())
+
+    def test_unavailable_product_rejects_whole_order(self):
+        Product.objects.filter(pk=self.products[1].pk).update(is_active=False)
+        response = self.place(self.products[:3])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_out_of_range_product_id_is_a_validation_error(self):
+        for pk in (2 ** 63, 10 ** 20):
+            response = self.client.post('/orders/', {'items': [{'product': pk, 'quantity': 1}]}, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_single_item_edit_refreshes_total(self):
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, product=self.products[0], quantity=3)
+        OrderItem.objects.create(order=order, product=self.products[1], quantity=1)
+        order.refresh_from_db()
+        self.assertEqual(str(order.total_price), "7.00")
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="stock@example.com", password="pass", first_name="S", last_name="Tock", role="customer"
+        )
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rice = Product.objects.create(name="Rice", description="", price="2.00", stock_quantity=5)
+            self.beans = Product.objects.create(name="Beans", description="", price="3.00", stock_quantity=1)
+
+    def place(self, *lines):
+        items = [{'product': product.pk, 'quantity': quantity} for product, quantity in lines]
+        return self.client.post('/orders/', {'items': items}, format='json')
+
+    def test_order_takes_stock(self):
+        # Repeated lines count together
+        response = self.place((self.rice, 2), (self.beans, 1), (self.rice, 1))
+        self.assertEqual(response.status_code, 201)
+        self.rice.refresh_from_db()
+        self.beans.refresh_from_db()
+        self.assertEqual((self.rice.stock_quantity, self.beans.stock_quantity), (2, 0))
+
+    def test_catalog_lists_show_new_stock_after_order(self):
+        anonymous = APIClient()
+        before = anonymous.get('/getallproducts/')
+        etag = self.client.get('/products/')['ETag']
+
+        with mock.patch.object(CatalogVersion, 'bump', wraps=CatalogVersion.bump) as bump, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.place((self.rice, 2), (self.beans, 1)).status_code, 201)
+        self.assertEqual(bump.call_count, 1)
+
+        after = anonymous.get('/getallproducts/')
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        stock = {product['id']: product['stock_quantity'] for product in after.json()['results']}
+        self.assertEqual(stock, {self.rice.pk: 3, self.beans.pk: 0})
+        self.assertEqual(self.client.get('/products/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        facets = self.client.get('/products/', {'in_stock': 'true'}).data['results']
+        self.assertEqual([product['id'] for product in facets], [self.rice.pk])
+
+    def test_shortfall_is_reported_and_nothing_is_taken(self):
+        response = self.place((self.rice, 3), (self.beans, 2))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            response.data['shortfall'],
+            [{'product': self.beans.pk, 'requested': 2, 'available': 1}],
+        )
+        self.rice.refresh_from_db()
+        self.assertEqual(self.rice.stock_quantity, 5)
+        self.assertFalse(Order.objects.exists())
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    def test_hot_product_is_never_oversold(self):
+        product = Product.objects.create(name="Hot", description="", price="1.00", stock_quantity=25)
+        users = [
+            User.objects.create_user(
+                email=f"rush{n}@example.com", password="pass", first_name="R", last_name="Ush", role="customer"
+            )
+            for n in range(4)
+        ]
+        result = hammer(product, users, orders=60, threads=8)
+        self.assertEqual((result['placed'], result['rejected'], result['remaining']), (25, 35, 0))
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="checkout@example.com", password="pass", first_name="C", last_name="Heckout", role="customer"
+        )
+        self.client.force_authenticate(self.user)
+        self.products = Product.objects.bulk_create([
+            Product(name=f"Item {i}", description="", price="4.25", stock_quantity=3, sku=f"CHK-{i}")
+            for i in range(10)
+        ])
+
+    def fill_cart(self, products, quantity=2):
+        Cart.objects.bulk_create([Cart(user=self.user, product=product, quantity=quantity) for product in products])
+
+    def test_checkout_orders_cart_and_empties_it(self):
+        self.fill_cart(self.products[:3])
+        Product.objects.filter(pk=self.products[0].pk).update(price="5.00")  # snapshot is taken at checkout
+
+        response = self.client.post('/checkout/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total_price'], "27.00")
+        self.assertEqual([item['product'] for item in response.data['items']], [p.pk for p in self.products[:3]])
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        self.assertEqual(Product.objects.get(pk=self.products[1].pk).stock_quantity, 1)
+
+    def test_query_count_only_grows_by_stock_updates(self):
+        self.fill_cart(self.products[:1])
+        with self.assertNumQueries(10) as one_line:
+            self.client.post('/checkout/')
+        self.fill_cart(self.products[1:])
+        with self.assertNumQueries(len(one_line.captured_queries) + 8):
+            self.assertEqual(self.client.post('/checkout/').status_code, 201)
+
+    def test_empty_cart_and_shortfall_leave_cart_alone(self):
+        self.assertEqual(self.client.post('/checkout/').status_code, 400)
+
+        self.fill_cart(self.products[:2], quantity=4)
+        response = self.client.post('/checkout/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 2)
+        self.assertFalse(Order.objects.exists())
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="retry@example.com", password="pass", first_name="R", last_name="Etry", role="customer"
+        )
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(name="Rice", description="", price="2.00", stock_quantity=5)
+
+    def post(self, key, quantity=1):
+        return self.client.post(
+            '/orders/', {'items': [{'product': self.product.pk, 'quantity': quantity}]},
+            format='json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_first_response(self):
+        first = self.post('abc')
+        retry = self.post('abc')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.json()), (201, first.json()))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, 4)
+
+        # Keys are per user and per key
+        self.assertEqual(self.post('other').status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.post('abc')
+        self.assertEqual(self.post('abc', quantity=2).status_code, 422)
+
+    def test_error_responses_are_replayed(self):
+        self.assertEqual(self.post('big', quantity=9).status_code, 409)
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=20)
+        self.assertEqual(self.post('big', quantity=9).status_code, 409)
+
+    def test_duplicate_waits_for_in_flight_request(self):
+        self.post('abc')
+        record = IdempotencyKey.objects.get()
+        stored = (record.status_code, record.response_body)
+        IdempotencyKey.objects.update(status_code=None, response_body=None)
+
+        def first_request_finishes(_):
+            IdempotencyKey.objects.update(status_code=stored[0], response_body=stored[1])
+
+        with mock.patch('orderediterm.idempotency.time.sleep', side_effect=first_request_finishes) as sleep:
+            response = self.post('abc')
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_in_flight_duplicate_gives_up_after_wait_timeout(self):
+        self.post('abc')
+        IdempotencyKey.objects.update(status_code=None)
+        with mock.patch('orderediterm.idempotency.WAIT_TIMEOUT', 0):
+            self.assertEqual(self.post('abc').status_code, 409)
+
+    def test_expired_key_runs_again(self):
+        self.post('abc')
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        self.assertEqual(self.post('abc').status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+
+
+class ManagerOrderListTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user(
+            email="boss@example.com", password="pass", first_name="B", last_name="Oss", role="manager"
+        )
+        self.alice = User.objects.create_user(
+            email="alice@example.com", password="pass", first_name="A", last_name="Lice", role="customer"
+        )
+        self.bob = User.objects.create_user(
+            email="bob@example.com", password="pass", first_name="B", last_name="Ob", role="customer"
+        )
+        self.client.force_authenticate(self.manager)
+        product = Product.objects.create(name="Rice", description="", price="2.00", stock_quantity=5)
+        self.start = start = timezone.now() - timezone.timedelta(days=30)
+        self.orders = Order.objects.bulk_create([
+            Order(user=self.alice if n % 2 else self.bob, status='paid' if n % 3 == 0 else 'pending',
+                  total_price=n * 10)
+            for n in range(30)
+        ])
+        for n, order in enumerate(self.orders):
+            Order.objects.filter(pk=order.pk).update(created_at=start + timezone.timedelta(days=n))
+        OrderItem.objects.bulk_create(
+            [OrderItem(order=order, product=product, quantity=1, price="2.00") for order in self.orders]
+        )
+
+    def ids(self, response):
+        return [order['id'] for order in response.data['results']]
+
+    def test_pages_follow_cursor_newest_first(self):
+        first = self.client.get('/manager/orders/?page_size=20')
+        second = self.client.get(first.data['next'])
+        self.assertEqual(self.ids(first) + self.ids(second), [order.pk for order in reversed(self.orders)])
+        self.assertIsNone(second.data['next'])
+
+    def test_filters(self):
+        cutoff = (self.start + timezone.timedelta(days=20)).isoformat()
+        cases = {
+            'status=paid': [o for n, o in enumerate(self.orders) if n % 3 == 0],
+            'customer=ALICE@example.com': [o for n, o in enumerate(self.orders) if n % 2],
+            'customer=nobody@example.com': [],
+            'min_total=250': self.orders[25:],
+            f'created_after={cutoff}': self.orders[20:],
+            'status=pending&min_total=200&customer=bob@example.com': [self.orders[n] for n in (20, 22, 26, 28)],
+        }
+        for query, expected in cases.items():
+            with self.subTest(query=query):
+                response = self.client.get(f'/manager/orders/?page_size=100&{query.replace("+", "%2B")}')
+                self.assertEqual(self.ids(response), [order.pk for order in reversed(expected)])
+
+    def test_filtered_pages_follow_cursor(self):
+        cutoff = (self.start + timezone.timedelta(days=4)).isoformat().replace('+', '%2B')
+        cases = {
+            'status=pending': [o for n, o in enumerate(self.orders) if n % 3],
+            'customer=alice@example.com&min_total=50': [o for n, o in enumerate(self.orders) if n % 2 and n >= 5],
+            f'status=paid&created_after={cutoff}': [o for n, o in enumerate(self.orders) if n % 3 == 0 and n >= 4],
+        }
+        for query, expected in cases.items():
+            with self.subTest(query=query):
+                seen, pages, url = [], 0, f'/manager/orders/?page_size=3&{query}'
+                while url:
+                    response = self.client.get(url)
+                    self.assertLessEqual(len(response.data['results']), 3)
+                    seen += self.ids(response)
+                    pages += 1
+                    url = response.data['next']
+                self.assertEqual(seen, [order.pk for order in reversed(expected)])
+                self.assertEqual(pages, -(-len(expected) // 3))
+
+    def test_invalid_filter_and_non_manager(self):
+        self.assertEqual(self.client.get('/manager/orders/?status=lost').status_code, 400)
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.get('/manager/orders/').status_code, 403)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        with self.assertNumQueries(2):
+            self.client.get('/manager/orders/?page_size=5')
+        with self.assertNumQueries(2):
+            self.client.get('/manager/orders/?page_size=30')
+
+
+class OrderSerializationQueryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="lister@example.com", password="pass", first_name="L", last_name="Ister", role="manager"
+        )
+        self.client.force_authenticate(self.user)
+        self.products = Product.objects.bulk_create([
+            Product(name=f"Item {i}", description="", price="3.00", stock_quantity=100, sku=f"LIST-{i}")
+            for i in range(4)
+        ])
+        # The post_save hook makes each first image the product's cover
+        for product in self.products[:3]:
+            ProductImage.objects.create(product=product, image=f"product_images/list/{product.pk}.jpg")
+
+    def add_orders(self, count):
+        orders = Order.objects.bulk_create([Order(user=self.user) for _ in range(count)])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, price="3.00")
+            for order in orders
+            for product in self.products
+        ])
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(captured.captured_queries)
+
+    def test_listings_run_fixed_queries(self):
+        # User list, manager list and both dashboards
+        for url in ['/orders/', '/manager/orders/', '/manager/dashboard/', '/manager-dashboard/']:
+            with self.subTest(url=url):
+                self.add_orders(2)
+                few = self.count_queries(url)
+                self.add_orders(8)
+                self.assertEqual(self.count_queries(url), few)
+
+    def test_items_carry_cover_image_urls(self):
+        self.add_orders(1)
+        order = Order.objects.get()
+        for url in ['/orders/', f'/orders/{order.pk}/']:
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                items = (data[0] if isinstance(data, list) else data)['items']
+                self.assertEqual(
+                    [item['product_image'] for item in items],
+                    [f"http://testserver/media/product_images/list/{p.pk}.jpg" for p in self.products[:3]] + [''],
+                )
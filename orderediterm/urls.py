@@ -2,6 +2,7 @@ from django.urls import path
 from .views import (
     OrderListCreateView,
     OrderDetailView,
+    CheckoutView,
     ManagerOrderListView,
     ManagerDashboardView,
 )
@@ -9,6 +10,7 @@ from .views import (
 urlpatterns = [
     path('orders/', OrderListCreateView.as_view(), name='order-list-create'),
     path('orders/<int:pk>/', OrderDetailView.as_view(), name='order-detail'),
+    path('checkout/', CheckoutView.as_view(), name='checkout'),
     path('manager/orders/', ManagerOrderListView.as_view(), name='manager-orders'),
     path('manager/dashboard/', ManagerDashboardView.as_view(), name='manager-dashboard'),
 ]
@@ -2,24 +2,60 @@ from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import permissions, status
-from django.db.models import Sum
+from django.db.models import Count, Max, Sum
+from products.conditional import aggregate_etag, conditional_get, latest
+from products.pagination import KeysetPagination
+from .filters import OrderFilter
+from .idempotency import idempotent
 from .models import Order
+from .placement import checkout_cart
 from .serializers import OrderSerializer
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+# ------------------- CONDITIONAL GET VALIDATORS ----------------------
+
+def order_state(orders, prefix):
+    """
+    Validators for serialized orders: count, newest order change, and newest
+    change to a product they reference (items show the current name/price).
+    """
+    state = orders.aggregate(
+        count=Count('id', distinct=True),
+        updated_at=Max('updated_at'),
+        products_updated_at=Max('items__product__updated_at'),
+    )
+    if not state['count']:
+        return aggregate_etag(prefix, 0), None
+    etag = aggregate_etag(prefix, state['count'], state['updated_at'], state['products_updated_at'])
+    return etag, latest(state['updated_at'], state['products_updated_at'])
+
+
+def order_list_state(request):
+    return order_state(Order.objects.filter(user=request.user), f'orders-{request.user.pk}')
+
+
+def order_detail_state(request, pk):
+    etag, last_modified = order_state(Order.objects.filter(pk=pk, user=request.user), f'order-{pk}')
+    if last_modified is None:
+        return None, None
+    return etag, last_modified
+
+
 # ------------------- USER ORDER VIEWS ----------------------
 
 class OrderListCreateView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @conditional_get(order_list_state)
     def get(self, request):
-        orders = Order.objects.filter(user=request.user).order_by('-created_at')
+        orders = OrderSerializer.setup_eager_loading(Order.objects.filter(user=request.user)).order_by('-created_at')
         serializer = OrderSerializer(orders, many=True, context={'request': request})
         return Response(serializer.data)
 
+    @idempotent
     def post(self, request):
         data = request.data.copy()
         data['user'] = request.user.id
@@ -36,8 +72,9 @@ class OrderListCreateView(APIView):
 class OrderDetailView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @conditional_get(order_detail_state)
     def get(self, request, pk):
-        order = get_object_or_404(Order, pk=pk, user=request.user)
+        order = get_object_or_404(OrderSerializer.setup_eager_loading(Order.objects.all()), pk=pk, user=request.user)
         serializer = OrderSerializer(order, context={'request': request})
         return Response(serializer.data)
 
@@ -57,18 +94,41 @@ class OrderDetailView(APIView):
         return Response({'detail': 'Order deleted'}, status=status.HTTP_204_NO_CONTENT)
 
 
+# ------------------- CHECKOUT ----------------------
+
+class CheckoutView(APIView):
+    """POST: order everything in the cart and empty it, in one round trip."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @idempotent
+    def post(self, request):
+        order = checkout_cart(request.user)
+        return Response(OrderSerializer(order, context={'request': request}).data, status=status.HTTP_201_CREATED)
+
+
 # ------------------- MANAGER/ADMIN VIEWS ----------------------
 
 class ManagerOrderListView(APIView):
+    """
+    GET: All orders, newest first, one keyset page at a time. Filters:
+    ?status=, ?created_after= / ?created_before= (ISO 8601), ?customer=<email>,
+    ?min_total=.
+    """
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
         if not hasattr(request.user, 'role') or request.user.role not in ['manager', 'admin']:
             return Response({'detail': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
 
-        orders = Order.objects.all().order_by('-created_at')
-        serializer = OrderSerializer(orders, many=True, context={'request': request})
-        return Response(serializer.data)
+        filterset = OrderFilter(request.query_params, queryset=Order.objects.all())
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        orders = OrderSerializer.setup_eager_loading(filterset.qs)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(orders, request, view=self)
+        serializer = OrderSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
 
 class ManagerDashboardView(APIView):
@@ -80,7 +140,7 @@ class ManagerDashboardView(APIView):
 
         total_orders = Order.objects.count()
         total_sales = Order.objects.aggregate(total=Sum('total_price'))['total'] or 0
-        recent_orders = Order.objects.select_related('user').order_by('-created_at')[:5]
+        recent_orders = OrderSerializer.setup_eager_loading(Order.objects.all()).order_by('-created_at')[:5]
         serializer = OrderSerializer(recent_orders, many=True, context={'request': request})
 
         dashboard_data = {
@@ -1,3 +1,43 @@
+from unittest import mock
+
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from portalaccount.models import User
+from .models import Transaction
+
+
+class InitiatePaymentIdempotencyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="payer@example.com", password="pass", first_name="P", last_name="Ayer", role="customer"
+        )
+        self.client.force_authenticate(self.user)
+
+    def initiate(self, key):
+        return self.client.post(
+            '/payments/initiate/', {'amount': '150.00', 'email': 'payer@example.com'},
+            format='json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    @mock.patch('payment.views.requests.post')
+    def test_retry_does_not_call_paychangu_again(self, post):
+        post.return_value.json.return_value = {'status': 'success', 'data': {'checkout_url': 'https://pay.example/1'}}
+        first = self.initiate('pay-1')
+        retry = self.initiate('pay-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    @mock.patch('payment.views.requests.post')
+    def test_gateway_failure_can_be_retried(self, post):
+        from requests.exceptions import ConnectionError
+        post.side_effect = ConnectionError("timed out")
+        self.assertEqual(self.initiate('pay-2').status_code, 500)
 
-# Create your tests here.
+        post.side_effect = None
+        post.return_value.json.return_value = {'status': 'success'}
+        self.assertEqual(self.initiate('pay-2').status_code, 201)
+        self.assertEqual(post.call_count, 2)
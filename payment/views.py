@@ -10,6 +10,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse
 import json
 from django.utils.decorators import method_decorator
+from orderediterm.idempotency import idempotent
 
 
 # PayChangu API Base URL
@@ -27,6 +28,7 @@ class InitiatePaymentView(APIView):
     """
     Initiate PayChangu Standard Checkout
     """
+    @idempotent
     def post(self, request):
         data = request.data
         print("Received payment initiation request:", data)
@@ -6,6 +6,7 @@ from .models import User
 from .serializers import UserSerializer, LoginSerializer
 from rest_framework_simplejwt.tokens import RefreshToken, TokenError
 from django.contrib.auth import authenticate
+from cartwhishlist.guest import merge_into_user_cart, request_token
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,6 +23,7 @@ class SignUpView(APIView):
         serializer = UserSerializer(data=data)
         if serializer.is_valid():
             user = serializer.save()
+            merge_into_user_cart(user, request_token(request))  # guest cart, if any
             refresh = RefreshToken.for_user(user)
             return Response({
                 'refresh': str(refresh),
@@ -47,6 +49,7 @@ class LoginView(APIView):
         )
 
         if user:
+            merge_into_user_cart(user, request_token(request))  # guest cart, if any
             refresh = RefreshToken.for_user(user)
             return Response({
                 'refresh': str(refresh),
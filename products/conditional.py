@@ -0,0 +1,43 @@
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+
+def conditional_get(state_func):
+    """
+    Decorate an APIView `get` with ETag/Last-Modified handling.
+
+    `state_func(request, *args, **kwargs)` returns `(etag, last_modified)`
+    from a cheap query (a version row or an aggregate over updated_at),
+    never from the serialized body. It runs after DRF authentication and
+    before the handler, so a matching If-None-Match / If-Modified-Since is
+    answered with 304 without serializing anything. Return `(None, None)`
+    to skip validation (e.g. for a missing object; the handler then 404s).
+    """
+    def state(request, *args, **kwargs):
+        # condition() asks for the etag and last-modified separately
+        if not hasattr(request, '_conditional_state'):
+            request._conditional_state = state_func(request, *args, **kwargs)
+        return request._conditional_state
+
+    def etag(request, *args, **kwargs):
+        return state(request, *args, **kwargs)[0]
+
+    def last_modified(request, *args, **kwargs):
+        return state(request, *args, **kwargs)[1]
+
+    return method_decorator(condition(etag_func=etag, last_modified_func=last_modified))
+
+
+def aggregate_etag(prefix, *parts):
+    """Build an ETag value from counts/timestamps (None-safe)."""
+    values = [
+        part.isoformat() if hasattr(part, 'isoformat') else ('-' if part is None else str(part))
+        for part in parts
+    ]
+    return ':'.join([prefix, *values])
+
+
+def latest(*timestamps):
+    """Newest of the given timestamps, ignoring None."""
+    present = [ts for ts in timestamps if ts is not None]
+    return max(present) if present else None
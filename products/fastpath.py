@@ -0,0 +1,238 @@
+import re
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+from rest_framework.renderers import JSONRenderer
+
+from .models import Category, Product, ProductImage
+
+try:
+    import orjson
+except ImportError:  # optional: without it the fast path renders with DRF's encoder
+    orjson = None
+
+# Opt-in fast path (settings.PRODUCT_FAST_SERIALIZATION) for the read-only
+# product and category list payloads. Rows come from .values() and are turned
+# into the exact dicts ProductSerializer / CategoryLatestProductsSerializer /
+# CategorySummarySerializer would produce, without per-field serializer
+# machinery, and rendered with orjson to the same bytes as DRF's JSONRenderer.
+# Any change to those serializers' read fields must be mirrored here; the
+# equivalence tests in products/tests.py compare the two paths.
+
+PRODUCT_VALUES = (
+    'id', 'name', 'description', 'price', 'sku', 'stock_quantity',
+    'category__name', 'primary_image', 'is_active', 'created_at',
+)
+IMAGE_VALUES = ('id', 'product_id', 'image', 'status', 'variants')
+SUMMARY_VALUES = (
+    'id', 'name', 'slug', 'description', 'parent_category',
+    'product_count', 'min_price', 'max_price', 'image_name',
+)
+CENT = Decimal('0.01')
+# Paths urljoin would rewrite: empty or dot segments
+UNNORMALIZED_PATH = re.compile(r'//|(^|/)\.{1,2}(/|$)')
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+def enabled():
+    return getattr(settings, 'PRODUCT_FAST_SERIALIZATION', False)
+
+
+# ----- field representations (as DRF renders them) -----
+
+def decimal_repr(value):
+    # DecimalField(decimal_places=2) with COERCE_DECIMAL_TO_STRING
+    return None if value is None else '{:f}'.format(value.quantize(CENT))
+
+
+class DateTimeRepr:
+    """DateTimeField.to_representation: ISO 8601 in the current timezone, 'Z' for UTC."""
+    def __init__(self):
+        self.tz = timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def __call__(self, value):
+        if value is None:
+            return None
+        if self.tz is not None and timezone.is_aware(value):
+            value = value.astimezone(self.tz)
+        text = value.isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+
+
+class MediaUrls:
+    """
+    request.build_absolute_uri(storage.url(name)), memoized per name. For the
+    usual FileSystemStorage under a root-relative MEDIA_URL, that is just the
+    absolute media base plus the quoted name, so the per-image urljoin and
+    urlsplit are skipped whenever the name can't be changed by them.
+    """
+    def __init__(self, request):
+        self.request = request
+        self.storage = ProductImage._meta.get_field('image').storage
+        self.cache = {}
+        base_url = getattr(self.storage, 'base_url', None) or ''
+        plain_base = (
+            isinstance(self.storage, FileSystemStorage)
+            and base_url.startswith('/') and base_url.endswith('/')
+            and not UNNORMALIZED_PATH.search(base_url)
+        )
+        self.base = None
+        if plain_base:
+            self.base = request.build_absolute_uri(base_url) if request else base_url
+
+    def __call__(self, name):
+        url = self.cache.get(name)
+        if url is None:
+            path = filepath_to_uri(name).lstrip('/') if self.base else None
+            if path is not None and not UNNORMALIZED_PATH.search(path):
+                url = self.base + path
+            else:
+                url = self.storage.url(name)
+                if self.request is not None:
+                    url = self.request.build_absolute_uri(url)
+            self.cache[name] = url
+        return url
+
+
+# ----- payload builders -----
+
+def image_data(row, url):
+    variants = row['variants']
+    srcset = {}
+    for width, formats in sorted(variants.items(), key=lambda item: int(item[0])):
+        for fmt, name in formats.items():
+            srcset.setdefault(fmt, []).append(f"{url(name)} {width}w")
+    return {
+        'id': row['id'],
+        'image': url(row['image']) if row['image'] else None,
+        'status': row['status'],
+        'variants': {
+            width: {fmt: url(name) for fmt, name in formats.items()}
+            for width, formats in variants.items()
+        },
+        'srcset': {fmt: ', '.join(entries) for fmt, entries in srcset.items()},
+    }
+
+
+def product_data(row, images, created_at):
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'description': row['description'],
+        'price': decimal_repr(row['price']),
+        'sku': row['sku'],
+        'stock_quantity': row['stock_quantity'],
+        'category': row['category__name'],
+        'images': images,
+        'primary_image': row['primary_image'],
+        'is_active': row['is_active'],
+        'created_at': created_at(row['created_at']),
+    }
+
+
+def images_by_product(product_ids, request):
+    # Same WHERE (and so the same row order) as prefetch_related('images')
+    url = MediaUrls(request)
+    grouped = defaultdict(list)
+    if product_ids:
+        for row in ProductImage.objects.filter(product_id__in=product_ids).values(*IMAGE_VALUES):
+            grouped[row['product_id']].append(image_data(row, url))
+    return grouped
+
+
+def product_list_data(rows, request):
+    """ProductSerializer(many=True).data for PRODUCT_VALUES rows, with one image query."""
+    images = images_by_product([row['id'] for row in rows], request)
+    created_at = DateTimeRepr()
+    return [product_data(row, images.get(row['id'], []), created_at) for row in rows]
+
+
+def category_products_data(limit, request, next_link):
+    """
+    CategoryLatestProductsSerializer(many=True).data: each category's `limit`
+    newest products. One extra row per category is read to tell whether the
+    page continues; `next_link(category_id, rows)` builds products_next.
+    """
+    categories = list(Category.objects.values('id', 'name', 'description'))
+    ranked = (
+        Product.objects.filter(category__isnull=False)
+        .annotate(rank=Window(
+            RowNumber(),
+            partition_by=[F('category_id')],
+            order_by=[F('created_at').desc(), F('id').desc()],
+        ))
+        .filter(rank__lte=limit + 1)
+        .order_by('category_id', '-created_at', '-id')
+        .values('category_id', *PRODUCT_VALUES)
+    )
+    rows_by_category = defaultdict(list)
+    for row in ranked:
+        rows_by_category[row['category_id']].append(row)
+    rows = [row for group in rows_by_category.values() for row in group[:limit]]
+    products = product_list_data(rows, request)
+    by_category = defaultdict(list)
+    for row, data in zip(rows, products):
+        by_category[row['category_id']].append(data)
+    return [
+        {
+            **category,
+            'products': by_category.get(category['id'], []),
+            'products_next': next_link(category['id'], rows_by_category.get(category['id'], [])),
+        }
+        for category in categories
+    ]
+
+
+def category_summary_data(queryset, request):
+    """CategorySummarySerializer(many=True).data for a setup_eager_loading() queryset."""
+    url = MediaUrls(request)
+    return [
+        {
+            'id': row['id'],
+            'name': row['name'],
+            'slug': row['slug'],
+            'description': row['description'],
+            'parent_category': row['parent_category'],
+            'product_count': row['product_count'],
+            'min_price': decimal_repr(row['min_price']),
+            'max_price': decimal_repr(row['max_price']),
+            'image': url(row['image_name']) if row['image_name'] else None,
+        }
+        for row in queryset.values(*SUMMARY_VALUES)
+    ]
+
+
+# ----- rendering -----
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer output produced by orjson. Datetimes go through DRF's
+    encoder (orjson would format them differently); anything orjson can't
+    encode falls back to the stock renderer.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or renderer_context and renderer_context.get('indent'):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            body = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except (orjson.JSONEncodeError, TypeError):
+            return super().render(data, accepted_media_type, renderer_context)
+        # JSONRenderer escapes the two JS-hostile line separators too
+        for raw, escaped in LINE_SEPARATORS:
+            body = body.replace(raw, escaped)
+        return body
+
+
+def render_json(data):
+    renderer = FastJSONRenderer() if enabled() else JSONRenderer()
+    return renderer.render(data)
@@ -0,0 +1,87 @@
+from decimal import Decimal
+
+import django_filters
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import Category, Product
+
+# ?sort= value -> KeysetPagination.ordering. Ordering is applied by the
+# paginator, not the filterset, so the cursor always seeks on the sort column.
+SORT_ORDERINGS = {
+    'newest': '-created_at',
+    'price': 'price',
+    '-price': '-price',
+}
+
+# Lower bounds of the price facet buckets; the last bucket is open-ended.
+PRICE_BUCKETS = [Decimal(edge) for edge in getattr(
+    settings, 'PRODUCT_PRICE_BUCKETS', ['0', '1000', '5000', '10000', '50000']
+)]
+
+
+class ProductFilter(django_filters.FilterSet):
+    min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
+    category = django_filters.NumberFilter(method='filter_category')
+    is_active = django_filters.BooleanFilter()
+    in_stock = django_filters.BooleanFilter(method='filter_in_stock')
+    sort = django_filters.ChoiceFilter(
+        choices=[(key, key) for key in SORT_ORDERINGS],
+        method='filter_sort',
+    )
+
+    class Meta:
+        model = Product
+        fields = ['min_price', 'max_price', 'category', 'is_active', 'in_stock', 'sort']
+
+    def filter_category(self, queryset, name, value):
+        path = Category.objects.filter(pk=value).values_list('path', flat=True).first()
+        if path is None:
+            return queryset.none()
+        return queryset.filter(category__path__startswith=path)
+
+    def filter_in_stock(self, queryset, name, value):
+        if value:
+            return queryset.filter(stock_quantity__gt=0)
+        return queryset.filter(stock_quantity=0)
+
+    def filter_sort(self, queryset, name, value):
+        return queryset
+
+    @property
+    def ordering(self):
+        return SORT_ORDERINGS[self.form.cleaned_data.get('sort') or 'newest']
+
+
+def product_facets(queryset):
+    """
+    Facet counts for a filtered product queryset: one grouped query for
+    categories and one conditional aggregate for all price buckets.
+    """
+    categories = (
+        queryset.order_by()
+        .values('category_id', 'category__name')
+        .annotate(count=Count('id'))
+        .order_by('-count', 'category__name')
+    )
+
+    bounds = list(zip(PRICE_BUCKETS, PRICE_BUCKETS[1:] + [None]))
+    aggregates = {}
+    for index, (low, high) in enumerate(bounds):
+        condition = Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        aggregates[f'bucket_{index}'] = Count('id', filter=condition)
+    bucket_counts = queryset.order_by().aggregate(**aggregates)
+
+    return {
+        'categories': [
+            {'id': row['category_id'], 'name': row['category__name'], 'count': row['count']}
+            for row in categories
+        ],
+        'price': [
+            {'min': low, 'max': high, 'count': bucket_counts[f'bucket_{index}']}
+            for index, (low, high) in enumerate(bounds)
+        ],
+    }
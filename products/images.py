@@ -0,0 +1,107 @@
+import hashlib
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .storage import blob_name, replace_file
+
+# Image processing for ProductImage: metadata stripping and fixed-width WebP
+# and JPEG copies written next to the original, recorded in
+# ProductImage.variants. Run by the image worker (products.jobs), not in the
+# upload request.
+
+IMAGE_WIDTHS = getattr(settings, 'PRODUCT_IMAGE_WIDTHS', [160, 480, 1024])
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+
+def derivative_name(original_name, width, fmt):
+    root, _ = os.path.splitext(original_name)
+    return f"{root}__w{width}.{EXTENSIONS[fmt]}"
+
+
+def render_derivatives(source, widths=IMAGE_WIDTHS):
+    """
+    Yield (width, fmt, bytes) for every derivative of the open image file
+    `source`. Widths wider than the original are skipped rather than upscaled,
+    except that the smallest requested width is always produced.
+    """
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+        smallest = min(widths)
+        for width in sorted(widths):
+            if width > image.width and width != smallest:
+                continue
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+            for fmt, (pil_format, options) in FORMATS.items():
+                frame = resized.convert('RGB') if pil_format == 'JPEG' else resized
+                buffer = io.BytesIO()
+                frame.save(buffer, pil_format, **options)
+                yield width, fmt, buffer.getvalue()
+
+
+def strip_metadata(product_image):
+    """
+    Store a copy of the original without EXIF (GPS, device data), with the
+    EXIF orientation applied to the pixels, and point `product_image` at it
+    (unsaved). The copy is content-addressed like any upload; the original
+    blob may be shared, so it is left for the caller to release. Raises if
+    the file isn't a readable image.
+    """
+    field = product_image.image
+    storage = field.storage
+    with storage.open(field.name, 'rb') as source:
+        with Image.open(source) as original:
+            original.load()
+            if not original.getexif() and 'icc_profile' not in original.info:
+                return
+            pil_format = original.format or 'JPEG'
+            image = ImageOps.exif_transpose(original)
+
+    if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    options = {'quality': 90} if pil_format in ('JPEG', 'WEBP') else {}
+    image.save(buffer, pil_format, **options)
+
+    data = buffer.getvalue()
+    name = blob_name(hashlib.sha256(data).hexdigest(), field.name)
+    if not storage.exists(name):
+        name = storage.save(name, ContentFile(data))
+    field.name = name
+
+
+def generate_derivatives(product_image, force=False, commit=True):
+    """
+    Create the resized copies for `product_image` and set their names on it
+    (saved unless `commit=False`). Returns the variants map. Existing
+    variants are kept unless `force`.
+    """
+    if product_image.variants and not force:
+        return product_image.variants
+
+    field = product_image.image
+    storage = field.storage
+    variants = {}
+    with storage.open(field.name, 'rb') as source:
+        for width, fmt, data in render_derivatives(source):
+            # Replaced, not deleted first: other images may be serving these files
+            name = replace_file(storage, derivative_name(field.name, width, fmt), data)
+            variants.setdefault(str(width), {})[fmt] = name
+
+    product_image.variants = variants
+    if commit:
+        product_image.save(update_fields=['variants'])
+    return variants
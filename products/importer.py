@@ -0,0 +1,235 @@
+import codecs
+import csv
+import json
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+
+from .models import CatalogVersion, Category, Product
+from .search import reindex_products
+
+# Bulk product import from CSV or JSON Lines. Rows are read lazily, checked
+# in Python, and inserted with bulk_create in batches; a bad row is reported
+# and skipped without aborting the run. Because bulk_create bypasses
+# Product.save and signals, SKUs, the search index and the catalog version
+# are handled here.
+
+FORMATS = ('csv', 'jsonl')
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+PRICE_LIMIT = Decimal('99999999.99')  # max_digits=10, decimal_places=2
+STOCK_LIMIT = 2147483647  # largest PositiveIntegerField value on every backend
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f', ''}
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(lines, fmt):
+    """Yield (line_number, dict) from an iterable of text lines."""
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield number, RowError(f"Invalid JSON: {exc}")
+                continue
+            yield number, row if isinstance(row, dict) else RowError("Each line must be a JSON object.")
+    else:
+        raise ValueError(f"Unsupported format {fmt!r}; expected one of {', '.join(FORMATS)}.")
+
+
+def decode_lines(byte_stream, encoding='utf-8-sig'):
+    """Lazily decode a binary file-like object into text lines (dropping a BOM, as Excel writes)."""
+    return codecs.iterdecode(iter(byte_stream.readline, b''), encoding)
+
+
+def parse_price(value):
+    try:
+        price = Decimal(str(value).strip())
+        # NaN/Infinity parse fine but can't be compared or stored
+        if not price.is_finite():
+            raise RowError("'price' must be a finite number.")
+        if price < 0 or price > PRICE_LIMIT:
+            raise RowError("'price' is out of range.")
+        return price.quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise RowError("'price' must be a number.")
+
+
+def parse_stock(value):
+    if isinstance(value, bool):
+        raise RowError("'stock_quantity' must be an integer.")
+    try:
+        stock = int(str(value).strip())
+    except ValueError:
+        raise RowError("'stock_quantity' must be an integer.")
+    if stock < 0:
+        raise RowError("'stock_quantity' cannot be negative.")
+    if stock > STOCK_LIMIT:
+        raise RowError("'stock_quantity' is out of range.")
+    return stock
+
+
+def parse_flag(value, key):
+    if isinstance(value, bool):
+        return value
+    flag = str(value).strip().lower()
+    if flag not in TRUE_VALUES | FALSE_VALUES:
+        raise RowError(f"'{key}' must be true or false.")
+    return flag in TRUE_VALUES
+
+
+def generate_sku():
+    return f"SKU-{uuid.uuid4().hex[:8].upper()}"
+
+
+class ProductImporter:
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.categories = dict(Category.objects.values_list('slug', 'id'))
+        self.seen_skus = set()
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+        self.created_ids = []
+
+    # ----- row validation -----
+
+    def text(self, row, key, required=False):
+        value = row.get(key)
+        value = '' if value is None else str(value).strip()
+        if required and not value:
+            raise RowError(f"'{key}' is required.")
+        return value
+
+    def build(self, row):
+        name = self.text(row, 'name', required=True)
+        if len(name) > 255:
+            raise RowError("'name' is longer than 255 characters.")
+
+        price = parse_price(self.text(row, 'price', required=True))
+        stock = parse_stock(self.text(row, 'stock_quantity') or 0)
+
+        category_id = None
+        slug = self.text(row, 'category')
+        if slug:
+            category_id = self.categories.get(slug)
+            if category_id is None:
+                raise RowError(f"Unknown category slug {slug!r}.")
+
+        is_active = parse_flag(row.get('is_active', True), 'is_active')
+
+        sku = self.text(row, 'sku')
+        if len(sku) > 100:
+            raise RowError("'sku' is longer than 100 characters.")
+        if sku in self.seen_skus:
+            raise RowError(f"SKU {sku!r} appears more than once in this file.")
+
+        return Product(
+            name=name,
+            description=self.text(row, 'description'),
+            price=price,
+            stock_quantity=stock,
+            category_id=category_id,
+            is_active=is_active,
+            sku=sku,
+        )
+
+    def record_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': line, 'error': message})
+
+    # ----- batching -----
+
+    def assign_skus(self, batch):
+        """Reject explicit SKUs that already exist, generate the rest without collisions."""
+        explicit = {product.sku for _, product in batch if product.sku}
+        taken = set(Product.objects.filter(sku__in=explicit).values_list('sku', flat=True))
+        accepted = []
+        for line, product in batch:
+            if product.sku in taken:
+                self.record_error(line, f"SKU {product.sku!r} already exists.")
+                continue
+            accepted.append((line, product))
+
+        generated = [product for _, product in accepted if not product.sku]
+        while generated:
+            for product in generated:
+                product.sku = generate_sku()
+            candidates = {product.sku for product in generated}
+            clashes = set(Product.objects.filter(sku__in=candidates).values_list('sku', flat=True))
+            # Also regenerate any duplicates within the batch or run
+            counts = {}
+            for product in generated:
+                counts[product.sku] = counts.get(product.sku, 0) + 1
+            generated = [
+                product for product in generated
+                if product.sku in clashes or product.sku in self.seen_skus or counts[product.sku] > 1
+            ]
+        for _, product in accepted:
+            self.seen_skus.add(product.sku)
+        return accepted
+
+    def flush(self, batch):
+        accepted = self.assign_skus(batch)
+        if not accepted:
+            return
+        try:
+            with transaction.atomic():
+                created = Product.objects.bulk_create([product for _, product in accepted])
+        except IntegrityError:
+            # A concurrent writer took one of the SKUs; isolate the offending rows
+            created = []
+            for line, product in accepted:
+                try:
+                    with transaction.atomic():
+                        product.save(force_insert=True)
+                    created.append(product)
+                except IntegrityError as exc:
+                    self.record_error(line, f"Database rejected row: {exc}")
+        ids = [product.pk for product in created]
+        reindex_products(ids)
+        self.created_ids.extend(ids)
+        self.created += len(created)
+
+    def run(self, rows):
+        """Import `rows` ((line, dict) pairs from read_rows) and return the report."""
+        batch = []
+        for line, row in rows:
+            if isinstance(row, Exception):
+                self.record_error(line, str(row))
+                continue
+            try:
+                product = self.build(row)
+            except RowError as exc:
+                self.record_error(line, str(exc))
+                continue
+            if product.sku:
+                self.seen_skus.add(product.sku)
+            batch.append((line, product))
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        if batch:
+            self.flush(batch)
+        if self.created:
+            CatalogVersion.bump()
+        return self.report()
+
+    def report(self):
+        return {
+            'created': self.created,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
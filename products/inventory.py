@@ -0,0 +1,115 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .importer import RowError, parse_flag, parse_price, parse_stock
+from .models import CatalogVersion, Product
+
+# Bulk price/stock/visibility updates for inventory sync. Records identify a
+# product by `id` or `sku`; each batch is loaded with one query per key type
+# and written with one bulk_update per set of fields sent, all inside one
+# transaction. Only the fields a record sent are written, so a price-only
+# record never writes back a stock level that order placement has since
+# decremented. The catalog version is bumped once, when the transaction commits.
+
+DEFAULT_BATCH_SIZE = 500
+MAX_RECORDS = 20000  # per API request
+MAX_ID = 2 ** 63 - 1  # BigAutoField range
+UPDATE_PARSERS = {
+    'price': parse_price,
+    'stock_quantity': parse_stock,
+    'is_active': lambda value: parse_flag(value, 'is_active'),
+}
+
+
+def parse_record(record):
+    """Return (key, value, changes) for one update record, or raise RowError."""
+    if not isinstance(record, dict):
+        raise RowError("Each record must be an object.")
+    if record.get('id') is not None:
+        try:
+            key, value = 'id', int(record['id'])
+        except (TypeError, ValueError):
+            raise RowError("'id' must be an integer.")
+        if not 1 <= value <= MAX_ID:
+            raise RowError("'id' is out of range.")
+    elif record.get('sku'):
+        key, value = 'sku', str(record['sku'])
+    else:
+        raise RowError("Each record needs an 'id' or a 'sku'.")
+
+    changes = {
+        field: parse(record[field])
+        for field, parse in UPDATE_PARSERS.items()
+        if record.get(field) is not None
+    }
+    if not changes:
+        raise RowError(f"Nothing to update; send one of {', '.join(UPDATE_PARSERS)}.")
+    return key, value, changes
+
+
+def apply_batch(batch, results):
+    """Apply parsed (index, key, value, changes) records; fill in `results` by index."""
+    ids = {value for _, key, value, _ in batch if key == 'id'}
+    skus = {value for _, key, value, _ in batch if key == 'sku'}
+    fields = ['id', 'sku', *UPDATE_PARSERS]
+    by_key = {'id': {}, 'sku': {}}
+    if ids:
+        for product in Product.objects.filter(pk__in=ids).only(*fields):
+            by_key['id'][product.pk] = product
+    if skus:
+        for product in Product.objects.filter(sku__in=skus).only(*fields):
+            by_key['sku'][product.sku] = product
+
+    now = timezone.now()
+    changed = {}  # pk -> (product, fields sent for it)
+    for index, key, value, changes in batch:
+        product = by_key[key].get(value)
+        if product is None:
+            results[index] = {key: value, 'status': 'error', 'error': 'Product not found.'}
+            continue
+        for field, new_value in changes.items():
+            setattr(product, field, new_value)
+        product.updated_at = now  # bulk_update doesn't apply auto_now
+        fields = changed[product.pk][1] if product.pk in changed else set()
+        changed[product.pk] = (product, fields | set(changes))
+        results[index] = {'id': product.pk, 'sku': product.sku, 'status': 'updated'}
+
+    # One UPDATE per distinct field set (usually just one per batch)
+    groups = {}
+    for product, fields in changed.values():
+        groups.setdefault(frozenset(fields), []).append(product)
+    for fields, products in groups.items():
+        Product.objects.bulk_update(products, [*sorted(fields), 'updated_at'])
+    if changed:
+        CatalogVersion.bump_on_commit()
+    return len(changed)
+
+
+def bulk_update_products(records, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Apply update records in one transaction and return a report with one
+    result per record, in input order. Invalid or unknown records are
+    reported and skipped; they don't roll back the others.
+    """
+    results = [None] * len(records)
+    updated = 0
+    with transaction.atomic():
+        batch = []
+        for index, record in enumerate(records):
+            try:
+                key, value, changes = parse_record(record)
+            except RowError as exc:
+                results[index] = {'status': 'error', 'error': str(exc)}
+                continue
+            batch.append((index, key, value, changes))
+            if len(batch) >= batch_size:
+                updated += apply_batch(batch, results)
+                batch = []
+        if batch:
+            updated += apply_batch(batch, results)
+
+    return {
+        'updated': updated,
+        'error_count': sum(1 for result in results if result['status'] == 'error'),
+        'results': results,
+    }
@@ -0,0 +1,139 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .images import generate_derivatives, strip_metadata
+from .models import CatalogVersion, Product, ProductImage
+from .storage import release_blob
+
+logger = logging.getLogger(__name__)
+
+# A DB-backed queue over ProductImage rows in status 'processing'. Any number
+# of `process_image_jobs` workers may run; a row is claimed by a conditional
+# UPDATE on (status, locked_at), which works the same on SQLite and Postgres.
+# A claim older than LOCK_TIMEOUT is treated as a crashed worker and retried.
+# A failed attempt is retried after RETRY_BACKOFF, doubling per attempt, so a
+# transient error (storage hiccup) isn't spent through MAX_ATTEMPTS at once.
+
+LOCK_TIMEOUT = timedelta(seconds=getattr(settings, 'IMAGE_JOB_LOCK_TIMEOUT', 300))
+MAX_ATTEMPTS = getattr(settings, 'IMAGE_JOB_MAX_ATTEMPTS', 3)
+RETRY_BACKOFF = timedelta(seconds=getattr(settings, 'IMAGE_JOB_RETRY_BACKOFF', 30))
+CLAIM_CANDIDATES = 20
+
+
+def claimable():
+    now = timezone.now()
+    return ProductImage.objects.filter(status='processing').filter(
+        Q(locked_at__isnull=True) | Q(locked_at__lt=now - LOCK_TIMEOUT),
+        Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now),
+    )
+
+
+def retry_delay(attempts):
+    """How long an image waits after its `attempts`-th failure: 1x, 2x, 4x ... RETRY_BACKOFF."""
+    return RETRY_BACKOFF * 2 ** max(attempts - 1, 0)
+
+
+def claim_next_image():
+    """Claim the oldest pending image for this worker, or return None."""
+    for pk in claimable().order_by('pk').values_list('pk', flat=True)[:CLAIM_CANDIDATES]:
+        claimed = claimable().filter(pk=pk).update(
+            locked_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        if claimed:
+            return ProductImage.objects.get(pk=pk)
+    return None
+
+
+def share_result(product_image):
+    """
+    Hand a finished image's file and derivatives to every other pending row
+    with the same content hash, so duplicates are processed only once.
+    """
+    if not product_image.content_hash:
+        return
+    siblings = ProductImage.objects.filter(
+        content_hash=product_image.content_hash, status='processing'
+    ).exclude(pk=product_image.pk)
+    product_ids = list(siblings.values_list('product_id', flat=True))
+    if not product_ids:
+        return
+    siblings.update(
+        image=product_image.image.name,
+        variants=product_image.variants,
+        status='ready',
+        error='',
+        locked_at=None,
+    )
+    # Bulk update skips signals; publish the change ourselves
+    Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now())
+    CatalogVersion.bump_on_commit()
+
+
+def release_replaced(product_image, old_name):
+    """After commit, drop the blob `product_image` moved off if nothing else uses it."""
+    if product_image.image.name != old_name:
+        digest = product_image.content_hash
+        transaction.on_commit(lambda: release_blob(old_name, {}, digest))
+
+
+def process_image(product_image):
+    """Run the whole pipeline for one claimed image and record the outcome."""
+    original_name = product_image.image.name
+    done = (
+        ProductImage.objects.filter(content_hash=product_image.content_hash, status='ready')
+        .exclude(content_hash='')
+        .values('image', 'variants')
+        .first()
+    )
+    if done:
+        product_image.image.name = done['image']
+        product_image.variants = done['variants']
+        product_image.status = 'ready'
+        product_image.locked_at = None
+        product_image.save(update_fields=['image', 'variants', 'status', 'locked_at'])
+        release_replaced(product_image, original_name)
+        return True
+
+    try:
+        strip_metadata(product_image)
+        generate_derivatives(product_image, force=True, commit=False)
+    except Exception as exc:  # decode/IO errors are per-image, never fatal to the worker
+        logger.warning("Image %s failed (attempt %s): %s", product_image.pk, product_image.attempts, exc)
+        product_image.error = str(exc)[:1000]
+        product_image.locked_at = None
+        # Keep the original; a stripped copy nothing else uses is dropped
+        stripped_name, product_image.image.name = product_image.image.name, original_name
+        release_replaced(product_image, stripped_name)
+        if product_image.attempts >= MAX_ATTEMPTS:
+            product_image.status = 'failed'
+        else:
+            product_image.next_attempt_at = timezone.now() + retry_delay(product_image.attempts)
+        product_image.save(update_fields=['status', 'error', 'locked_at', 'next_attempt_at'])
+        return False
+
+    product_image.status = 'ready'
+    product_image.error = ''
+    product_image.locked_at = None
+    with transaction.atomic():  # one catalog bump for the image and its duplicates
+        product_image.save(update_fields=['image', 'variants', 'status', 'error', 'locked_at'])
+        share_result(product_image)
+        # The duplicates now point at the stripped copy too
+        release_replaced(product_image, original_name)
+    return True
+
+
+def run_pending(limit=None):
+    """Process pending images until the queue is empty (or `limit` is hit)."""
+    processed = 0
+    while limit is None or processed < limit:
+        product_image = claim_next_image()
+        if product_image is None:
+            break
+        process_image(product_image)
+        processed += 1
+    return processed
@@ -0,0 +1,105 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from products import fastpath
+from products.images import IMAGE_WIDTHS
+from products.models import Category, Product, ProductImage
+from products.serializers import ProductSerializer
+from products.signals import first_image_id
+
+
+def bench_variants(stem):
+    return {
+        str(width): {'webp': f"{stem}__w{width}.webp", 'jpeg': f"{stem}__w{width}.jpg"}
+        for width in IMAGE_WIDTHS
+    }
+
+
+def seed(count):
+    """Insert `count` products with two processed images each (rolled back by the caller)."""
+    categories = Category.objects.bulk_create(
+        [Category(name=f"Bench {n}", slug=f"bench-{n}") for n in range(20)]
+    )
+    products = Product.objects.bulk_create(
+        [
+            Product(
+                name=f"Bench product {n}", description="Benchmark row " * 8, price=f"{n % 5000}.99",
+                sku=f"BENCH-{n:07d}", stock_quantity=n % 50, category=categories[n % len(categories)],
+            )
+            for n in range(count)
+        ],
+        batch_size=2000,
+    )
+    ProductImage.objects.bulk_create(
+        [
+            ProductImage(
+                product=product, image=f"product_images/bench/{product.pk}-{side}.jpg",
+                content_hash=f"{product.pk:032d}{side:032d}", status='ready',
+                variants=bench_variants(f"product_images/bench/{product.pk}-{side}"),
+            )
+            for product in products
+            for side in (1, 2)
+        ],
+        batch_size=2000,
+    )
+    Product.objects.filter(primary_image__isnull=True).update(primary_image=first_image_id())
+
+
+def best_of(repeat, func):
+    timings, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare ProductSerializer + JSONRenderer with the fast serialization path on "
+        "synthetic catalogs. Seeds inside a transaction that is always rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='1000,10000,100000',
+            help='Comma-separated product counts to benchmark.',
+        )
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best is kept).')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError("--sizes must be comma-separated integers.")
+        request = RequestFactory().get('/getallproducts/', HTTP_HOST='shop.example.com')
+
+        self.stdout.write(f"{'products':>9} {'serializer':>11} {'fast path':>10} {'speedup':>8}")
+        for size in sizes:
+            with transaction.atomic():
+                seed(size)
+                queryset = Product.objects.order_by('-created_at', '-id')
+
+                def slow():
+                    products = ProductSerializer.setup_eager_loading(queryset)
+                    data = ProductSerializer(products, many=True, context={'request': request}).data
+                    return JSONRenderer().render(data)
+
+                def fast():
+                    rows = list(queryset.values(*fastpath.PRODUCT_VALUES))
+                    return fastpath.FastJSONRenderer().render(fastpath.product_list_data(rows, request))
+
+                slow_time, slow_body = best_of(options['repeat'], slow)
+                fast_time, fast_body = best_of(options['repeat'], fast)
+                transaction.set_rollback(True)
+
+            if slow_body != fast_body:
+                raise CommandError(f"Fast path output differs from ProductSerializer at {size} products.")
+            self.stdout.write(
+                f"{size:>9} {slow_time:>10.3f}s {fast_time:>9.3f}s {slow_time / fast_time:>7.1f}x"
+            )
@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.inventory import DEFAULT_BATCH_SIZE, bulk_update_products
+
+
+class Command(BaseCommand):
+    help = "Apply price/stock/is_active updates from a JSON array or JSON Lines file (records keyed by id or sku)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSON or JSONL file of update records.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Records written per bulk_update.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], encoding='utf-8-sig') as handle:
+                text = handle.read()
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        try:
+            if text.lstrip().startswith('['):
+                records = json.loads(text)
+            else:
+                records = [json.loads(line) for line in text.splitlines() if line.strip()]
+        except ValueError as exc:
+            raise CommandError(f"Invalid JSON: {exc}")
+
+        report = bulk_update_products(records, batch_size=options['batch_size'])
+        for index, result in enumerate(report['results'], start=1):
+            if result['status'] == 'error':
+                self.stderr.write(f"Record {index}: {result['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {report['updated']} products ({report['error_count']} records rejected)."
+        ))
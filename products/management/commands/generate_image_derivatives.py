@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from products.images import generate_derivatives
+from products.models import CatalogVersion, ImageBlob, Product, ProductImage
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP/JPEG derivatives for product images that don't have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate derivatives for every image, not just missing ones.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Rows fetched per database round trip.',
+        )
+
+    def handle(self, *args, **options):
+        # Images that share content share one file and one derivative set, so
+        # work per stored file. Files an image job is still on are the worker's.
+        images = ProductImage.objects.filter(status='ready').exclude(
+            image__in=ProductImage.objects.filter(status='processing').values('image')
+        )
+        if not options['force']:
+            images = images.filter(variants={})
+        names = images.order_by('image').values_list('image', flat=True).distinct()
+
+        done = failed = 0
+        last = ''
+        # Keyset batches: processed rows drop out of the non-force filter as we go
+        while batch := list(names.filter(image__gt=last)[:options['batch_size']]):
+            last = batch[-1]
+            for name in batch:
+                try:
+                    self.generate(images.filter(image=name), force=options['force'])
+                except (OSError, ValueError) as exc:
+                    failed += 1
+                    self.stderr.write(f"Image {name}: {exc}")
+                    continue
+                done += 1
+                if done % 100 == 0:
+                    self.stdout.write(f"{done} images processed...")
+
+        if done:
+            CatalogVersion.bump_on_commit()
+        self.stdout.write(self.style.SUCCESS(f"Generated derivatives for {done} images ({failed} failed)."))
+
+    @transaction.atomic
+    def generate(self, rows, force):
+        """Render one file's derivatives and record them on every row using it."""
+        # Same lock as uploads and deletes, so the file can't be released meanwhile
+        for digest in sorted(set(rows.exclude(content_hash='').values_list('content_hash', flat=True))):
+            ImageBlob.lock(digest)
+        product_image = rows.first()
+        if product_image is None:  # deleted since the names were listed
+            return
+        variants = generate_derivatives(product_image, force=force, commit=False)
+        # Bulk update skips signals; publish the change ourselves
+        product_ids = list(rows.values_list('product_id', flat=True))
+        rows.update(variants=variants)
+        Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now())
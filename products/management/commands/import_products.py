@@ -0,0 +1,45 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importer import DEFAULT_BATCH_SIZE, FORMATS, ProductImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = "Bulk-create products from a CSV or JSON Lines file (category given by slug)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file to import.')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Input format; defaults to the file extension.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Rows inserted per bulk_create.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt == 'ndjson':
+            fmt = 'jsonl'
+        if fmt not in FORMATS:
+            raise CommandError(f"Can't tell the format of {path}; pass --format.")
+
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as handle:
+                report = ProductImporter(batch_size=options['batch_size']).run(read_rows(handle, fmt))
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        for error in report['errors']:
+            self.stderr.write(f"Row {error['row']}: {error['error']}")
+        if report['error_count'] > len(report['errors']):
+            self.stderr.write(f"... and {report['error_count'] - len(report['errors'])} more errors.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['created']} products ({report['error_count']} rows rejected)."
+        ))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+
+from products.jobs import run_pending
+
+
+class Command(BaseCommand):
+    help = (
+        "Process uploaded product images (EXIF stripping, resizing, derivatives). "
+        "Safe to run several workers at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue and exit instead of polling forever.',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between polls when the queue is empty.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                processed = run_pending()
+            except DatabaseError as exc:
+                if options['once']:
+                    raise
+                # e.g. the server dropped our connection; reconnect on the next poll
+                self.stderr.write(f"Database error, retrying: {exc}")
+                processed = 0
+            if processed:
+                self.stdout.write(f"Processed {processed} images.")
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+            # Like the request cycle does: drop a connection that has gone
+            # away or outlived CONN_MAX_AGE before the next poll uses it
+            close_old_connections()
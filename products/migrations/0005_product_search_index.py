@@ -0,0 +1,96 @@
+from django.db import migrations
+
+# Full-text index over product name, description and category name.
+# Postgres gets a trigger-maintained tsvector column with a GIN index.
+# SQLite (local/CI) gets an FTS5 table kept in sync by products.signals:
+# SQLite rebuilds a table for most ALTERs, and triggers that reference the
+# rebuilt table would abort later migrations. The column/table is invisible
+# to the ORM and only read by products.search.
+
+POSTGRES_FORWARD = [
+    "ALTER TABLE products_product ADD COLUMN search_vector tsvector",
+    """
+    CREATE FUNCTION products_product_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(
+                (SELECT name FROM products_category WHERE id = NEW.category_id), '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER products_product_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description, category_id ON products_product
+    FOR EACH ROW EXECUTE FUNCTION products_product_search_vector_update()
+    """,
+    """
+    CREATE FUNCTION products_category_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        UPDATE products_product SET name = name WHERE category_id = NEW.id;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER products_category_search_vector_trigger
+    AFTER UPDATE OF name ON products_category
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE FUNCTION products_category_search_vector_update()
+    """,
+    "UPDATE products_product SET name = name",
+    "CREATE INDEX product_search_vector_gin ON products_product USING GIN (search_vector)",
+]
+
+POSTGRES_REVERSE = [
+    "DROP TRIGGER IF EXISTS products_category_search_vector_trigger ON products_category",
+    "DROP FUNCTION IF EXISTS products_category_search_vector_update()",
+    "DROP TRIGGER IF EXISTS products_product_search_vector_trigger ON products_product",
+    "DROP FUNCTION IF EXISTS products_product_search_vector_update()",
+    "DROP INDEX IF EXISTS product_search_vector_gin",
+    "ALTER TABLE products_product DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE products_product_fts USING fts5(
+        name, description, category, tokenize = 'porter unicode61'
+    )
+    """,
+    """
+    INSERT INTO products_product_fts (rowid, name, description, category)
+    SELECT p.id, p.name, p.description, c.name
+    FROM products_product p LEFT JOIN products_category c ON c.id = p.category_id
+    """,
+]
+
+SQLITE_REVERSE = [
+    "DROP TABLE IF EXISTS products_product_fts",
+]
+
+
+def run_for_vendor(postgres, sqlite):
+    def run(apps, schema_editor):
+        statements = {
+            'postgresql': postgres,
+            'sqlite': sqlite,
+        }.get(schema_editor.connection.vendor, [])
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(POSTGRES_FORWARD, SQLITE_FORWARD),
+            run_for_vendor(POSTGRES_REVERSE, SQLITE_REVERSE),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-18 12:44
+
+from django.db import migrations, models
+
+
+def populate_paths(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    parents = dict(Category.objects.values_list('id', 'parent_category_id'))
+
+    def build(pk, seen=()):
+        parent_id = parents.get(pk)
+        # Treat a pre-existing cycle as a root rather than recursing forever
+        if parent_id is None or parent_id in seen:
+            return f"/{pk}/"
+        return f"{build(parent_id, seen + (pk,))}{pk}/"
+
+    for pk in parents:
+        Category.objects.filter(pk=pk).update(path=build(pk))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(populate_paths, migrations.RunPython.noop),
+    ]
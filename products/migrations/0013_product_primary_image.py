@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 13:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_primary_images(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductImage = apps.get_model('products', 'ProductImage')
+    first = ProductImage.objects.filter(product=OuterRef('pk')).order_by('pk').values('pk')[:1]
+    Product.objects.update(primary_image=Subquery(first))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_productimage_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='primary_image',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='products.productimage'),
+        ),
+        migrations.RunPython(populate_primary_images, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,8 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
 from django.utils.text import slugify
 import uuid
 
@@ -13,12 +17,58 @@ class Category(models.Model):
         related_name='subcategories'
     )
     slug = models.SlugField(unique=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Materialized path of ancestor ids, e.g. "/1/5/9/" for 9 under 5 under 1.
+    # A subtree is every row whose path starts with the root's path.
+    path = models.CharField(max_length=255, blank=True, db_index=True, editable=False)
+
+    CYCLE_MESSAGE = "A category cannot be moved under itself or one of its subcategories."
+
+    def get_parent_path(self):
+        if self.parent_category_id:
+            return Category.objects.values_list('path', flat=True).get(pk=self.parent_category_id)
+        return '/'
+
+    def clean(self):
+        super().clean()
+        if self.pk and self.parent_category_id:
+            stored_path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first()
+            if stored_path and self.get_parent_path().startswith(stored_path):
+                raise ValidationError({'parent_category': self.CYCLE_MESSAGE})
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+
+        parent_path = self.get_parent_path()
+
+        if not self.pk:
+            super().save(*args, **kwargs)
+            self.path = f"{parent_path}{self.pk}/"
+            Category.objects.filter(pk=self.pk).update(path=self.path)
+            return
+
+        old_name, old_path = Category.objects.filter(pk=self.pk).values_list('name', 'path').first() or (None, '')
+        if old_path and parent_path.startswith(old_path):
+            # clean() reports this as a validation error; getting here is a caller bug
+            raise ValueError(self.CYCLE_MESSAGE)
+        self.path = f"{parent_path}{self.pk}/"
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'path', 'updated_at'}
+        # Read by the post_save search signal: products only need reindexing if these moved
+        self._search_changed = (old_name, old_path) != (self.name, self.path)
         super().save(*args, **kwargs)
 
+        if old_path and old_path != self.path:
+            # Re-parented: rewrite the prefix of every descendant in one UPDATE
+            Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(Value(self.path), Substr('path', len(old_path) + 1))
+            )
+
+    def get_descendants(self, include_self=True):
+        descendants = Category.objects.filter(path__startswith=self.path)
+        return descendants if include_self else descendants.exclude(pk=self.pk)
+
     def __str__(self):
         return self.name
 
@@ -36,24 +86,163 @@ class Product(models.Model):
         related_name='products'
     )
     is_active = models.BooleanField(default=True)
+    # Cover image, maintained by products.signals (first upload by default) so
+    # listings can select_related it instead of querying images per row
+    primary_image = models.ForeignKey(
+        'ProductImage',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+    )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Backs keyset pagination on (created_at, id), newest first
+            models.Index(fields=['-created_at', '-id'], name='product_created_id_idx'),
+            # Backs the list filters: category subtree, price range/sort, storefront default
+            models.Index(fields=['category', '-created_at'], name='product_category_created_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='product_active_instock_idx',
+                condition=models.Q(is_active=True, stock_quantity__gt=0),
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.sku:
             self.sku = f"SKU-{uuid.uuid4().hex[:8].upper()}"
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'updated_at'}
         super().save(*args, **kwargs)
 
+    def set_primary_image(self, image):
+        """Make one of this product's images its cover."""
+        if image.product_id != self.pk:
+            raise ValidationError("The cover image must belong to this product.")
+        self.primary_image = image
+        self.save(update_fields=['primary_image'])
+
     def __str__(self):
         return self.name
 
 
 class ProductImage(models.Model):
+    STATUS_CHOICES = (
+        ('processing', 'Processing'),  # Stored as uploaded, waiting for the image worker
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    )
+
     product = models.ForeignKey(
         Product,
         on_delete=models.CASCADE,
         related_name='images'
     )
-    image = models.ImageField(upload_to='product_images/')
+    # Indexed: a stored file's references are looked up by name before it is deleted
+    image = models.ImageField(upload_to='product_images/', db_index=True)
+    # SHA-256 of the uploaded bytes; rows with the same hash share one stored file
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    # Resized copies stored next to the original, by width then format:
+    # {"480": {"webp": "product_images/x__w480.webp", "jpeg": "..."}, ...}
+    variants = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='processing')
+    error = models.TextField(blank=True)
+    # Job bookkeeping for `process_image_jobs` workers (see products.jobs)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # After a failed attempt the image waits until then before it is retried
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['id'],
+                name='productimage_pending_idx',
+                condition=models.Q(status='processing'),
+            ),
+        ]
 
     def __str__(self):
         return f"Image for {self.product.name}"
+
+
+class ImageBlob(models.Model):
+    """
+    One row per uploaded content hash, used as a lock: storing an upload and
+    deleting a blob nothing references any more both take it first, so a
+    delete can't race an upload that is about to reuse the same file.
+    """
+    content_hash = models.CharField(max_length=64, unique=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+
+    @classmethod
+    def lock(cls, content_hash):
+        """
+        Lock `content_hash` until the current transaction ends (call it inside
+        one). A conditional UPDATE rather than SELECT .. FOR UPDATE, so SQLite
+        serializes on it too.
+        """
+        now = timezone.now()
+        if cls.objects.filter(content_hash=content_hash).update(locked_at=now):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(content_hash=content_hash, locked_at=now)
+        except IntegrityError:
+            # Created by a concurrent writer since our UPDATE; wait on theirs
+            cls.objects.filter(content_hash=content_hash).update(locked_at=now)
+
+
+class CatalogVersion(models.Model):
+    """
+    Single row whose `version` changes on every catalog write. The snapshot
+    cache keys on it, so bumping it (after the writer commits) retires every
+    cached catalog payload at once, across all worker processes.
+    """
+    version = models.CharField(max_length=32, default='initial')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def state(cls):
+        """(version, updated_at) of the catalog; updated_at is None before the first write."""
+        row = cls.objects.filter(pk=1).values_list('version', 'updated_at').first()
+        return row or ('initial', None)
+
+    @classmethod
+    def current(cls):
+        return cls.state()[0]
+
+    @classmethod
+    def bump(cls):
+        version = uuid.uuid4().hex
+        if not cls.objects.filter(pk=1).update(version=version, updated_at=timezone.now()):
+            cls.objects.update_or_create(pk=1, defaults={'version': version})
+        return version
+
+    @classmethod
+    def bump_on_commit(cls):
+        """
+        Bump once the current transaction commits (at once in autocommit).
+        Any number of writes in one transaction share a single bump, and the
+        version row is never locked for the length of a writer's transaction.
+        """
+        connection = transaction.get_connection()
+        # Every write registers a callback, but they share one token and only
+        # the first to run bumps. A rolled-back transaction's token is simply
+        # reused by the next transaction on this connection.
+        pending = getattr(connection, 'catalog_bump_pending', None)
+        if pending is None:
+            pending = connection.catalog_bump_pending = object()
+
+        def bump():
+            if connection.catalog_bump_pending is not pending:
+                return  # already bumped for this commit
+            connection.catalog_bump_pending = None
+            cls.bump()
+        # Robust: the data is already committed, so a failed bump is logged
+        # (caches stay stale until the next write) rather than failing the caller
+        transaction.on_commit(bump, robust=True)
@@ -0,0 +1,124 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a (field, id) keyset, newest first by default.
+
+    Each page is fetched with a `(field, id) < (cursor)` seek instead of
+    OFFSET, so the cost of a page does not grow with how deep the client
+    is. The cursor is an opaque url-safe token; clients just follow `next`.
+    Set `ordering` (e.g. 'price' or '-price') before paginating to seek on
+    another column; the id tie-breaker follows the same direction.
+    """
+    ordering = '-created_at'
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = getattr(settings, 'PRODUCT_PAGE_SIZE', 24)
+    max_page_size = getattr(settings, 'PRODUCT_MAX_PAGE_SIZE', 100)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering_field(self):
+        descending = self.ordering.startswith('-')
+        return self.ordering.lstrip('-'), descending
+
+    def encode_cursor(self, instance):
+        field, _ = self.get_ordering_field()
+        if isinstance(instance, dict):  # .values() rows
+            value, pk = instance[field], instance['id']
+        else:
+            value, pk = getattr(instance, field), instance.pk
+        value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        raw = f"{value}|{pk}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, token, model):
+        field, _ = self.get_ordering_field()
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+            value, pk = raw.rsplit('|', 1)
+            return model._meta.get_field(field).to_python(value), int(pk)
+        except (ValueError, ValidationError, binascii.Error, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        field, descending = self.get_ordering_field()
+
+        if descending:
+            queryset = queryset.order_by(f'-{field}', '-pk')
+            seek = 'lt'
+        else:
+            queryset = queryset.order_by(field, 'pk')
+            seek = 'gt'
+        token = request.query_params.get(self.cursor_query_param)
+        if token:
+            value, pk = self.decode_cursor(token, queryset.model)
+            # The row comparison spelled out as an OR, behind a redundant
+            # `field <= value` (or >=) bound: planners can't turn the OR into
+            # an index range, but the bound lets them start the (field, id)
+            # index scan at the cursor instead of at the top.
+            queryset = queryset.filter(
+                Q(**{f'{field}__{seek}e': value}),
+                Q(**{f'{field}__{seek}': value}) | Q(**{field: value, f'pk__{seek}': pk}),
+            )
+
+        # Fetch one extra row to learn whether another page exists.
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if self.has_next else None
+        return page
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_resume_link(self, url, instance, page_size):
+        """`url` paged by `page_size` and resuming after `instance` (a row or a .values() dict)."""
+        url = replace_query_param(url, self.page_size_query_param, page_size)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(instance))
+
+    def get_first_link(self):
+        url = self.request.build_absolute_uri()
+        return remove_query_param(url, self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'first': self.get_first_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'first': {'type': 'string', 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,113 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Product
+
+# Full-text lookups against the index built in migration 0005. Each backend
+# returns product ids best match first; the view loads the rows via the ORM.
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+POSTGRES_SEARCH_SQL = """
+    SELECT id
+    FROM products_product, to_tsquery('english', %s) AS query
+    WHERE search_vector @@ query AND is_active
+    ORDER BY ts_rank(search_vector, query) DESC, id DESC
+    LIMIT %s
+"""
+
+# bm25() weights columns in declaration order: name, description, category.
+SQLITE_SEARCH_SQL = """
+    SELECT f.rowid
+    FROM products_product_fts f
+    JOIN products_product p ON p.id = f.rowid
+    WHERE products_product_fts MATCH %s AND p.is_active
+    ORDER BY bm25(products_product_fts, 10.0, 1.0, 5.0), f.rowid DESC
+    LIMIT %s
+"""
+
+
+SQLITE_UNINDEX_SQL = "DELETE FROM products_product_fts WHERE rowid IN ({placeholders})"
+
+SQLITE_INDEX_SQL = """
+    INSERT INTO products_product_fts (rowid, name, description, category)
+    SELECT p.id, p.name, p.description, c.name
+    FROM products_product p LEFT JOIN products_category c ON c.id = p.category_id
+    WHERE p.id IN ({placeholders})
+"""
+
+
+def uses_external_index():
+    """
+    True when the search index must be kept in sync from Python. Postgres
+    maintains its tsvector column with triggers; SQLite's FTS5 table is
+    refreshed through these helpers (see products.signals).
+    """
+    return connection.vendor == 'sqlite'
+
+
+def reindex_products(ids):
+    """Refresh the SQLite FTS rows for `ids` (rows that no longer exist are dropped)."""
+    ids = list(ids)
+    if not ids or not uses_external_index():
+        return
+    with connection.cursor() as cursor:
+        # Chunk to stay under SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(SQLITE_UNINDEX_SQL.format(placeholders=placeholders), chunk)
+            cursor.execute(SQLITE_INDEX_SQL.format(placeholders=placeholders), chunk)
+
+
+def _fts5_query(terms):
+    # Quote every token so user input can't inject FTS5 operators, and
+    # prefix-match the last one for type-ahead.
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _tsquery(terms):
+    # Same semantics as _fts5_query: every token required, the last one a
+    # prefix (`term:*`). Tokens are \w+ only, so none of them is an operator.
+    return ' & '.join(terms) + ':*'
+
+
+def _search_postgres(terms, limit):
+    with connection.cursor() as cursor:
+        cursor.execute(POSTGRES_SEARCH_SQL, [_tsquery(terms), limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_sqlite(terms, limit):
+    with connection.cursor() as cursor:
+        cursor.execute(SQLITE_SEARCH_SQL, [_fts5_query(terms), limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_fallback(terms, limit):
+    """Unindexed substring match for backends without a full-text index."""
+    filters = Q()
+    for term in terms:
+        filters &= (
+            Q(name__icontains=term)
+            | Q(description__icontains=term)
+            | Q(category__name__icontains=term)
+        )
+    queryset = Product.objects.filter(filters, is_active=True).order_by('-created_at', '-id')
+    return list(queryset.values_list('id', flat=True)[:limit])
+
+
+def search_product_ids(query, limit):
+    """Return ids of active products matching `query`, best match first."""
+    terms = TOKEN_RE.findall(query or '')
+    if not terms:
+        return []
+    if connection.vendor == 'postgresql':
+        return _search_postgres(terms, limit)
+    if connection.vendor == 'sqlite':
+        return _search_sqlite(terms, limit)
+    return _search_fallback(terms, limit)
@@ -1,12 +1,50 @@
+from django.conf import settings
+from django.core.validators import FileExtensionValidator, get_available_image_extensions
+from django.db import transaction
+from django.db.models import Count, Max, Min, OuterRef, Subquery
 from rest_framework import serializers
 from .models import Category, Product, ProductImage
+from .storage import store_product_image
+
+# Only formats the installed Pillow can open (HEIC needs a plugin); anything
+# else would be accepted here and then fail in the image worker
+IMAGE_EXTENSIONS = [
+    ext for ext in ['jpg', 'jpeg', 'png', 'webp', 'gif', 'bmp', 'tiff', 'heic']
+    if ext in get_available_image_extensions()
+]
+MAX_UPLOADED_IMAGES = getattr(settings, 'PRODUCT_MAX_UPLOADED_IMAGES', 10)
+
+
+class EagerLoadingMixin:
+    """
+    Lets a serializer declare the related rows it reads, so views can load
+    them up front instead of issuing one query per object.
+    """
+    select_related_fields = []
+    prefetch_related_fields = []
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        if cls.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*cls.prefetch_related_fields)
+        return queryset
+
 
 class ProductImageSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = ProductImage
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'status', 'variants', 'srcset']
+
+    def build_url(self, name):
+        request = self.context.get('request')
+        url = ProductImage._meta.get_field('image').storage.url(name)
+        return request.build_absolute_uri(url) if request else url
 
     def get_image(self, obj):
         request = self.context.get('request')
@@ -14,8 +52,26 @@ class ProductImageSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.image.url) if request else obj.image.url
         return None
 
+    def get_variants(self, obj):
+        """{"160": {"webp": url, "jpeg": url}, ...} for the generated derivatives."""
+        return {
+            width: {fmt: self.build_url(name) for fmt, name in formats.items()}
+            for width, formats in obj.variants.items()
+        }
+
+    def get_srcset(self, obj):
+        """Ready-made `srcset` strings per format, e.g. {"webp": "url 160w, url 480w"}."""
+        srcset = {}
+        for width, formats in sorted(obj.variants.items(), key=lambda item: int(item[0])):
+            for fmt, name in formats.items():
+                srcset.setdefault(fmt, []).append(f"{self.build_url(name)} {width}w")
+        return {fmt: ', '.join(entries) for fmt, entries in srcset.items()}
+
+
+class ProductSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ['category']
+    prefetch_related_fields = ['images']
 
-class ProductSerializer(serializers.ModelSerializer):
     category = serializers.StringRelatedField(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all(),
@@ -23,10 +79,18 @@ class ProductSerializer(serializers.ModelSerializer):
         write_only=True
     )
     images = ProductImageSerializer(many=True, read_only=True)  # nested images
+    # Plain FileField: decoding happens in the image worker, not the request.
+    # Unreadable files end up as images with status 'failed'.
     uploaded_images = serializers.ListField(
-        child=serializers.ImageField(max_length=1000000, allow_empty_file=False, use_url=False),
+        child=serializers.FileField(
+            max_length=1000000,
+            allow_empty_file=False,
+            use_url=False,
+            validators=[FileExtensionValidator(IMAGE_EXTENSIONS)],
+        ),
         write_only=True,
-        required=False
+        required=False,
+        max_length=MAX_UPLOADED_IMAGES,
     )
 
     class Meta:
@@ -41,19 +105,24 @@ class ProductSerializer(serializers.ModelSerializer):
             'category',        # read-only nested category name
             'category_id',     # write-only for creation/update
             'images',          # read-only nested images with full URLs
+            'primary_image',   # read-only id of the cover image (see ProductCoverView)
             'uploaded_images', # write-only images for upload
             'is_active',
             'created_at'
         ]
-        read_only_fields = ['sku', 'created_at']
+        read_only_fields = ['sku', 'primary_image', 'created_at']
 
+    # Atomic so the product and its images publish one catalog version bump
+    @transaction.atomic
     def create(self, validated_data):
         uploaded_images = validated_data.pop('uploaded_images', [])
         product = Product.objects.create(**validated_data)
+        # Just store the files; the image worker (process_image_jobs) does the rest
         for image in uploaded_images:
-            ProductImage.objects.create(product=product, image=image)
+            store_product_image(product, image)
         return product
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         uploaded_images = validated_data.pop('uploaded_images', [])
         for attr, value in validated_data.items():
@@ -61,12 +130,16 @@ class ProductSerializer(serializers.ModelSerializer):
         instance.save()
 
         for image in uploaded_images:
-            ProductImage.objects.create(product=instance, image=image)
+            store_product_image(instance, image)
 
         return instance
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    # Reverse-FK prefetch fills product.category from the parent, so only
+    # the images need a second hop.
+    prefetch_related_fields = ['products__images']
+
     products = ProductSerializer(many=True, read_only=True)
 
     class Meta:
@@ -77,3 +150,69 @@ class CategorySerializer(serializers.ModelSerializer):
             'description',
             'products'
         ]
+
+
+class CategoryLatestProductsSerializer(CategorySerializer):
+    """
+    CategorySerializer reading one page of products from `latest_products`
+    (Django can only slice a prefetch into a to_attr) instead of every
+    product, plus `products_next`: the URL that continues the page, or null.
+    """
+    products = ProductSerializer(many=True, read_only=True, source='latest_products')
+    products_next = serializers.URLField(read_only=True)
+
+    class Meta(CategorySerializer.Meta):
+        fields = CategorySerializer.Meta.fields + ['products_next']
+
+
+class CategorySummarySerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    """
+    Category without its products: counts, price range and a cover image,
+    all annotated onto the category rows by setup_eager_loading.
+    """
+    product_count = serializers.IntegerField(read_only=True)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Category
+        fields = [
+            'id',
+            'name',
+            'slug',
+            'description',
+            'parent_category',
+            'product_count',
+            'min_price',
+            'max_price',
+            'image',
+        ]
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        # Cover of the newest product that has one
+        cover = (
+            Product.objects
+            .filter(category=OuterRef('pk'), primary_image__isnull=False)
+            .order_by('-created_at', '-id')
+            .values('primary_image__image')[:1]
+        )
+        return queryset.annotate(
+            product_count=Count('products'),
+            min_price=Min('products__price'),
+            max_price=Max('products__price'),
+            image_name=Subquery(cover),
+        )
+
+    def get_image(self, obj):
+        if not obj.image_name:
+            return None
+        url = ProductImage._meta.get_field('image').storage.url(obj.image_name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class ProductCoverSerializer(serializers.Serializer):
+    """Body of POST /products/<pk>/cover/."""
+    image_id = serializers.IntegerField(min_value=1)
@@ -0,0 +1,91 @@
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Concat, Substr
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import CatalogVersion, Category, Product, ProductImage
+from .search import reindex_products, uses_external_index
+from .storage import release_blob
+
+
+@receiver(post_delete, sender=Category)
+def reroot_orphaned_subcategories(sender, instance, **kwargs):
+    """
+    Children of a deleted category become roots (parent_category is SET_NULL),
+    so strip the deleted prefix from their whole subtree's paths.
+    """
+    if not instance.path:
+        return
+    Category.objects.filter(path__startswith=instance.path).update(
+        path=Concat(Value('/'), Substr('path', len(instance.path) + 1))
+    )
+
+
+def first_image_id():
+    return Subquery(
+        ProductImage.objects.filter(product=OuterRef('pk')).order_by('pk').values('pk')[:1]
+    )
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_product(sender, instance, signal, created=False, **kwargs):
+    """
+    Images are part of the product's representation, so move its validator.
+    In the same UPDATE, give a product without a cover its oldest image: the
+    first upload, or a replacement once the cover is deleted (SET_NULL).
+    """
+    changes = {'updated_at': timezone.now()}
+    if created or signal is post_delete:
+        changes['primary_image'] = Coalesce(F('primary_image'), first_image_id())
+    Product.objects.filter(pk=instance.product_id).update(**changes)
+
+
+@receiver(post_delete, sender=ProductImage)
+def release_image_file(sender, instance, **kwargs):
+    # Stored files are shared by content hash; only the last reference deletes them
+    name, variants, digest = instance.image.name, instance.variants, instance.content_hash
+    transaction.on_commit(lambda: release_blob(name, variants, digest))
+
+
+# ----------------- SEARCH INDEX (SQLite FTS5) ------------------
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def reindex_product(sender, instance, **kwargs):
+    reindex_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, **kwargs):
+    # A new category has no products yet; otherwise only a rename or move matters
+    if not created and getattr(instance, '_search_changed', True) and uses_external_index():
+        reindex_products(instance.products.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Category)
+def collect_category_products(sender, instance, **kwargs):
+    # The SET_NULL on products happens as a bare UPDATE, so remember who to refresh
+    if uses_external_index():
+        instance._search_product_ids = list(instance.products.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def reindex_orphaned_products(sender, instance, **kwargs):
+    reindex_products(getattr(instance, '_search_product_ids', []))
+
+
+# ----------------- CATALOG SNAPSHOT VERSION ------------------
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_catalog_version(sender, **kwargs):
+    # After commit, so anything cached from the old data under the old
+    # version is retired; one bump per transaction however many rows changed.
+    CatalogVersion.bump_on_commit()
@@ -0,0 +1,136 @@
+import gzip
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from .fastpath import render_json
+from .models import CatalogVersion
+
+try:
+    import brotli
+except ImportError:  # optional: without it snapshots are served gzip-only
+    brotli = None
+
+# Rendered catalog payloads (anonymous /getallproducts/ and /getallcategories/)
+# cached per catalog version and request variant, stored raw and precompressed.
+# Writes never rebuild anything: they only bump CatalogVersion, and the next
+# read renders the new version once while concurrent readers wait for it.
+
+SNAPSHOT_TIMEOUT = getattr(settings, 'CATALOG_SNAPSHOT_TIMEOUT', 60 * 60)
+BUILD_LOCK_TIMEOUT = 30
+BUILD_WAIT_SECONDS = 5
+BUILD_POLL_INTERVAL = 0.05
+
+
+def variant_digest(request):
+    # Absolute URLs in the payload depend on scheme and host, pages on the query
+    params = sorted(request.GET.lists())
+    variant = f"{request.scheme}://{request.get_host()}|{params}"
+    return hashlib.sha1(variant.encode('utf-8')).hexdigest()
+
+
+def catalog_etag(name, version, request):
+    # Weak: the same representation is served under several encodings
+    return f'W/"{name}-{version}-{variant_digest(request)[:16]}"'
+
+
+def catalog_state(name):
+    """A conditional_get state function keyed on the catalog version."""
+    def state(request, *args, **kwargs):
+        version, updated_at = CatalogVersion.state()
+        return catalog_etag(name, version, request), updated_at
+    return state
+
+
+def build_snapshot(etag, data):
+    body = render_json(data)
+    snapshot = {
+        'etag': etag,
+        'identity': body,
+        'gzip': gzip.compress(body, compresslevel=6),
+    }
+    if brotli is not None:
+        snapshot['br'] = brotli.compress(body, quality=9)
+    return snapshot
+
+
+def choose_encoding(request, snapshot):
+    accepted = {}
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        q = params.strip()[2:] if params.strip().startswith('q=') else '1'
+        try:
+            accepted[coding.strip().lower()] = float(q)
+        except ValueError:
+            continue
+    for coding in ('br', 'gzip'):
+        if coding in snapshot and accepted.get(coding, 0) > 0:
+            return coding
+    return 'identity'
+
+
+def snapshot_response(request, snapshot):
+    encoding = choose_encoding(request, snapshot)
+    response = HttpResponse(snapshot[encoding], content_type='application/json')
+    if encoding != 'identity':
+        response['Content-Encoding'] = encoding
+    response['ETag'] = snapshot['etag']
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def wait_for_snapshot(key, lock_key):
+    """Poll while another request holds the build lock; None if it gave up."""
+    deadline = time.monotonic() + BUILD_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(BUILD_POLL_INTERVAL)
+        snapshot = cache.get(key)
+        if snapshot is not None or cache.get(lock_key) is None:
+            return snapshot
+    return None
+
+
+def catalog_response(request, name, render):
+    """
+    Serve the `name` catalog payload for this request from the snapshot cache,
+    or a 304 when the client's validators still match the catalog version.
+
+    `render` is called at most once per catalog version and variant; it must
+    return a DRF Response. Anything other than a 200 is passed through
+    uncached (e.g. filter validation errors).
+    """
+    version, updated_at = CatalogVersion.state()
+    etag = catalog_etag(name, version, request)
+    not_modified = get_conditional_response(
+        request._request if hasattr(request, '_request') else request,
+        etag=etag,
+        last_modified=int(updated_at.timestamp()) if updated_at else None,
+    )
+    if not_modified is not None:
+        return not_modified
+
+    key = f"catalog:{name}:{version}:{variant_digest(request)}"
+    lock_key = f"{key}:lock"
+
+    snapshot = cache.get(key)
+    if snapshot is None and not cache.add(lock_key, 1, BUILD_LOCK_TIMEOUT):
+        # Another request is rendering this version; share its result
+        snapshot = wait_for_snapshot(key, lock_key)
+        if snapshot is None:
+            cache.add(lock_key, 1, BUILD_LOCK_TIMEOUT)
+
+    if snapshot is None:
+        try:
+            response = render()
+            if response.status_code != 200:
+                return response
+            snapshot = build_snapshot(etag, response.data)
+            cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+
+    return snapshot_response(request, snapshot)
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import transaction
+
+from .models import ImageBlob, ProductImage
+
+# Content-addressed storage for product images. Uploads are streamed to a
+# temporary file and hashed chunk by chunk as they arrive, then stored once
+# under their SHA-256, so the same photo on several products shares one file
+# (and one derivative set). A blob is deleted when its last ProductImage is.
+# Storing and deleting both hold the upload hash's ImageBlob lock, so a
+# delete never removes a file a concurrent upload has just decided to reuse.
+# Blobs are never rewritten in place: a changed file gets a new name.
+
+UPLOAD_PREFIX = 'product_images'
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """
+    Always spool uploads to disk (never memory) and attach a `sha256`
+    attribute computed from the same chunks as they are written.
+    """
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.sha256 = self.hasher.hexdigest()
+        return upload
+
+
+def content_hash(upload):
+    """SHA-256 of an uploaded file, from the upload handler or by streaming it."""
+    digest = getattr(upload, 'sha256', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    for chunk in upload.chunks(HASH_CHUNK_SIZE):
+        hasher.update(chunk)
+    upload.seek(0)
+    return hasher.hexdigest()
+
+
+def blob_name(digest, original_name):
+    extension = os.path.splitext(original_name)[1].lower() or '.img'
+    return f"{UPLOAD_PREFIX}/{digest[:2]}/{digest}{extension}"
+
+
+def replace_file(storage, name, data):
+    """
+    Write `data` to `name`, overwriting any existing file, and return the
+    name. On local storage the bytes go to a temporary file that is renamed
+    over the old one, so a file served to other images is never missing.
+    """
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        # Remote storages have no rename to build on; fall back to delete and save
+        if storage.exists(name):
+            storage.delete(name)
+        return storage.save(name, ContentFile(data))
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(data)
+        os.chmod(temp_path, storage.file_permissions_mode or 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return name
+
+
+def store_product_image(product, upload):
+    """
+    Attach `upload` to `product`, storing the bytes only if no existing blob
+    has the same content. A duplicate of an already processed image is ready
+    immediately; otherwise the image worker picks it up.
+    """
+    storage = ProductImage._meta.get_field('image').storage
+    digest = content_hash(upload)
+    with transaction.atomic():
+        # Held until the caller commits, i.e. until the new row is visible
+        ImageBlob.lock(digest)
+        sibling = (
+            ProductImage.objects.filter(content_hash=digest)
+            .exclude(status='failed')
+            .order_by('-status', 'pk')  # prefer 'ready' over 'processing'
+            .values('image', 'status', 'variants')
+            .first()
+        )
+
+        if sibling and storage.exists(sibling['image']):
+            name = sibling['image']
+        else:
+            name = blob_name(digest, upload.name)
+            if not storage.exists(name):
+                name = storage.save(name, upload)
+            sibling = None
+
+        ready = sibling is not None and sibling['status'] == 'ready'
+        return ProductImage.objects.create(
+            product=product,
+            image=name,
+            content_hash=digest,
+            status='ready' if ready else 'processing',
+            variants=sibling['variants'] if ready else {},
+        )
+
+
+def release_blob(name, variants, digest=''):
+    """
+    Delete a stored image and its derivatives once no ProductImage uses it.
+    `digest` is the content hash of the upload the blob came from (blank for
+    images stored before content addressing, which are never shared).
+    """
+    if not name:
+        return
+    storage = ProductImage._meta.get_field('image').storage
+    with transaction.atomic():
+        if digest:
+            ImageBlob.lock(digest)
+        if ProductImage.objects.filter(image=name).exists():
+            return
+        for path in [name, *(p for formats in variants.values() for p in formats.values())]:
+            if storage.exists(path):
+                storage.delete(path)
@@ -1,3 +1,1047 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock, skipIf, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from portalaccount.models import User
+from . import jobs
+from .images import generate_derivatives
+from .models import CatalogVersion, Category, Product, ProductImage
+from .pagination import KeysetPagination
+from .serializers import IMAGE_EXTENSIONS
+from .signals import first_image_id
+from .snapshot import brotli
+
+
+def seed_catalog(count, categories=3, images_per_product=2):
+    """Bulk-create `count` products spread over a few categories, each with images."""
+    cats = [Category.objects.create(name=f"Category {i}") for i in range(categories)]
+    products = Product.objects.bulk_create([
+        Product(
+            name=f"Product {i}",
+            description="Seeded product",
+            price="9.99",
+            sku=f"SKU-SEED{i:06d}",
+            stock_quantity=i % 7,
+            category=cats[i % categories],
+        )
+        for i in range(count)
+    ])
+    ProductImage.objects.bulk_create([
+        ProductImage(product=product, image=f"product_images/seed-{product.pk}-{n}.jpg")
+        for product in products
+        for n in range(images_per_product)
+    ])
+    # bulk_create skips the signal that assigns covers
+    Product.objects.filter(primary_image__isnull=True).update(primary_image=first_image_id())
+    return cats, products
+
+
+class ProductQueryCountTests(TestCase):
+    """
+    Listing and detail endpoints must run a fixed number of queries no matter
+    how many products or images there are.
+    """
+    sizes = [10, 100, 1000]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.manager = User.objects.create_user(
+            email="manager@example.com", password="pass", first_name="M", last_name="Gr", role="manager"
+        )
+        self.client.force_authenticate(self.manager)
+
+    def reseed(self, size):
+        # Publish a new catalog version so earlier snapshots are retired
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.all().delete()
+            Category.objects.all().delete()
+            return seed_catalog(size)
+
+    def test_get_all_products_constant_queries(self):
+        for size in self.sizes:
+            with self.subTest(size=size):
+                self.reseed(size)
+                # catalog version + products page (category joined) + images prefetch
+                with self.assertNumQueries(3):
+                    response = self.client.get('/getallproducts/?page_size=100')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()['results']), min(size, 100))
+                self.assertEqual(len(response.json()['results'][0]['images']), 2)
+
+    def test_product_list_constant_queries(self):
+        for size in self.sizes:
+            with self.subTest(size=size):
+                self.reseed(size)
+                # catalog version + products page + images prefetch
+                with self.assertNumQueries(3):
+                    response = self.client.get('/products/?page_size=100')
+                self.assertEqual(response.status_code, 200)
+                self.assertIsNotNone(response.data['results'][0]['category'])
+
+    def test_category_summary_single_query(self):
+        for size in self.sizes:
+            with self.subTest(size=size):
+                self.reseed(size)
+                # catalog version + annotated categories
+                with self.assertNumQueries(2):
+                    response = self.client.get('/getallcategories/')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(sum(c['product_count'] for c in response.json()), size)
+                self.assertTrue(response.json()[0]['image'].startswith('http://testserver/media/'))
+                self.assertEqual(response.json()[0]['min_price'], '9.99')
+
+    def test_category_embedded_products_constant_queries(self):
+        for size in self.sizes:
+            with self.subTest(size=size):
+                self.reseed(size)
+                # catalog version + categories + capped nested products + their images
+                with self.assertNumQueries(4):
+                    response = self.client.get('/categories/?include=products&page_size=5')
+                self.assertEqual(response.status_code, 200)
+                counts = [len(c['products']) for c in response.data]
+                expected = [min(5, len(range(i, size, 3))) for i in range(3)]
+                self.assertEqual(counts, expected)
+
+    def test_detail_views_constant_queries(self):
+        cats, products = seed_catalog(50)
+        # validator + product (category joined) + images
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/products/{products[0].pk}/')
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/categories/{cats[0].pk}/')
+        self.assertEqual(response.status_code, 200)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.grains = Category.objects.create(name="Grains")
+        self.drinks = Category.objects.create(name="Drinks")
+        self.rice = Product.objects.create(
+            name="Kilombero rice", description="Aromatic long grain", price="12.00",
+            stock_quantity=5, category=self.grains,
+        )
+        self.maize = Product.objects.create(
+            name="Maize flour", description="Fine white ufa", price="8.00",
+            stock_quantity=5, category=self.grains,
+        )
+        self.juice = Product.objects.create(
+            name="Mango juice", description="Fresh rice-free drink", price="3.00",
+            stock_quantity=5, category=self.drinks,
+        )
+
+    def search(self, q):
+        response = self.client.get('/products/search/', {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search('rice'), [self.rice.pk, self.juice.pk])
+
+    def test_matches_category_name_and_prefix(self):
+        self.assertCountEqual(self.search('grain'), [self.rice.pk, self.maize.pk])
+        self.assertEqual(self.search('mang'), [self.juice.pk])
+
+    @skipUnless(connection.vendor == 'postgresql', "prefix tsquery is Postgres-only")
+    def test_postgres_prefix_matches_last_term(self):
+        self.assertEqual(self.search('mang'), [self.juice.pk])
+        self.assertEqual(self.search('kilombero ri'), [self.rice.pk])
+        self.assertEqual(self.search('ri kilombero'), [])  # only the last term is a prefix
+
+    def test_index_follows_updates_and_deletes(self):
+        self.grains.name = "Cereals"
+        self.grains.save()
+        self.assertCountEqual(self.search('cereals'), [self.rice.pk, self.maize.pk])
+
+        self.maize.is_active = False
+        self.maize.save()
+        self.juice.delete()
+        self.assertEqual(self.search('cereals'), [self.rice.pk])
+        self.assertEqual(self.search('mango'), [])
+
+    def test_operators_in_query_are_treated_as_text(self):
+        self.assertEqual(self.search('rice" OR NEAR('), [])
+        self.assertEqual(self.client.get('/products/search/').status_code, 400)
+
+
+class ProductFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.food = Category.objects.create(name="Food")
+        self.grains = Category.objects.create(name="Grains", parent_category=self.food)
+        self.rice = Category.objects.create(name="Rice", parent_category=self.grains)
+        self.tools = Category.objects.create(name="Tools")
+        self.products = {
+            name: Product.objects.create(
+                name=name, description="", price=price, stock_quantity=stock,
+                category=category, is_active=active,
+            )
+            for name, price, stock, category, active in [
+                ("basmati", "1500.00", 3, self.rice, True),
+                ("sorghum", "800.00", 0, self.grains, True),
+                ("relish", "200.00", 9, self.food, False),
+                ("hoe", "12000.00", 2, self.tools, True),
+            ]
+        }
+
+    def names(self, **params):
+        response = self.client.get('/getallproducts/', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()['results']]
+
+    def test_category_filter_includes_subtree(self):
+        self.assertCountEqual(self.names(category=self.food.pk), ["basmati", "sorghum", "relish"])
+        self.assertCountEqual(self.names(category=self.grains.pk), ["basmati", "sorghum"])
+
+    def test_price_stock_and_active_filters(self):
+        self.assertCountEqual(self.names(min_price=500, max_price=2000), ["basmati", "sorghum"])
+        self.assertCountEqual(self.names(in_stock='true', is_active='true'), ["basmati", "hoe"])
+
+    def test_price_sort_paginates_by_price(self):
+        response = self.client.get('/getallproducts/', {'sort': 'price', 'page_size': 2})
+        self.assertEqual([i['name'] for i in response.json()['results']], ["relish", "sorghum"])
+        response = self.client.get(response.json()['next'])
+        self.assertEqual([i['name'] for i in response.json()['results']], ["basmati", "hoe"])
+        self.assertIsNone(response.json()['next'])
+        self.assertEqual(self.names(sort='-price')[0], "hoe")
+
+    def test_facets(self):
+        response = self.client.get('/getallproducts/', {'category': self.food.pk, 'facets': 'true'})
+        facets = response.json()['facets']
+        self.assertEqual(sum(c['count'] for c in facets['categories']), 3)
+        self.assertEqual([b['count'] for b in facets['price']], [2, 1, 0, 0, 0])
+
+    def test_invalid_filter_is_rejected(self):
+        response = self.client.get('/getallproducts/', {'sort': 'bogus'})
+        self.assertEqual(response.status_code, 400)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            _, products = seed_catalog(7, categories=1, images_per_product=1)
+            # Half the rows share a timestamp, so the id tie-breaker has to do the work
+            Product.objects.filter(pk__in=[p.pk for p in products[2:6]]).update(
+                created_at=products[2].created_at
+            )
+        self.expected = list(Product.objects.order_by('-created_at', '-pk').values_list('pk', flat=True))
+
+    def test_cursor_round_trip_visits_every_row_once(self):
+        seen, url = [], '/getallproducts/?page_size=2'
+        while url:
+            data = self.client.get(url).json()
+            self.assertLessEqual(len(data['results']), 2)
+            seen += [item['id'] for item in data['results']]
+            url = data['next']
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(self.client.get(data['first']).json()['results'][0]['id'], self.expected[0])
+
+    def test_invalid_cursor_is_not_found(self):
+        for cursor in ('not-base64!', 'bm8tc2VwYXJhdG9y', 'Zm9vfGJhcg'):  # garbage, 'no-separator', 'foo|bar'
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/getallproducts/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+    def test_page_size_is_clamped(self):
+        # Anything that isn't a positive number falls back to the default (24 > 7 rows)
+        for size, expected in [('3', 3), ('0', 7), ('-5', 7), ('abc', 7)]:
+            with self.subTest(page_size=size):
+                results = self.client.get('/getallproducts/', {'page_size': size}).json()['results']
+                self.assertEqual(len(results), expected)
+        paginator = KeysetPagination()
+        request = APIRequestFactory().get('/', {'page_size': 10 ** 6})
+        self.assertEqual(paginator.get_page_size(Request(request)), paginator.max_page_size)
+
+
+class CategoryProductPagingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cats, _ = seed_catalog(11, categories=2, images_per_product=1)  # 6 + 5 products
+        self.expected = {
+            cat.pk: list(cat.products.order_by('-created_at', '-id').values_list('pk', flat=True))
+            for cat in self.cats
+        }
+
+    def walk(self, first_page):
+        seen, page = [], first_page
+        while True:
+            seen += [product['id'] for product in page['products']]
+            if page['products_next'] is None:
+                return seen
+            page = self.client.get(page['products_next']).json()
+            if isinstance(page, list):  # the narrowed category list
+                [page] = page
+            self.assertLessEqual(len(page['products']), 5)
+
+    def test_embedded_products_continue_by_cursor(self):
+        for fast in (False, True):
+            with self.subTest(fast=fast), self.settings(PRODUCT_FAST_SERIALIZATION=fast):
+                cache.clear()
+                categories = self.client.get('/getallcategories/', {'include': 'products', 'page_size': 4}).json()
+                for category in categories:
+                    self.assertEqual(len(category['products']), 4)
+                    self.assertEqual(self.walk(category), self.expected[category['id']])
+
+    def test_unknown_category_is_not_found(self):
+        for value in ('999999', 'x'):
+            with self.subTest(category=value):
+                response = self.client.get('/getallcategories/', {'include': 'products', 'category': value})
+                self.assertEqual(response.status_code, 404)
+
+    def test_detail_is_paginated(self):
+        self.client.force_authenticate(User.objects.create_user(
+            email="c@example.com", password="pass", first_name="C", last_name="U", role="customer"
+        ))
+        cat = self.cats[0]
+        data = self.client.get(f'/categories/{cat.pk}/', {'page_size': 5}).json()
+        self.assertEqual([p['id'] for p in data['products']], self.expected[cat.pk][:5])
+        self.assertEqual(self.walk(data), self.expected[cat.pk])
+        last = self.client.get(f'/categories/{cat.pk}/', {'page_size': 6}).json()
+        self.assertIsNone(last['products_next'])
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        self.food = Category.objects.create(name="Food")
+        self.grains = Category.objects.create(name="Grains", parent_category=self.food)
+        self.rice = Category.objects.create(name="Rice", parent_category=self.grains)
+        self.tools = Category.objects.create(name="Tools")
+
+    def refresh(self):
+        for category in (self.food, self.grains, self.rice, self.tools):
+            category.refresh_from_db()
+
+    def test_paths_on_create(self):
+        self.assertEqual(self.rice.path, f"/{self.food.pk}/{self.grains.pk}/{self.rice.pk}/")
+        self.assertCountEqual(self.food.get_descendants(), [self.food, self.grains, self.rice])
+
+    def test_reparent_moves_whole_subtree(self):
+        self.grains.parent_category = self.tools
+        self.grains.save()
+        self.refresh()
+        self.assertEqual(self.rice.path, f"/{self.tools.pk}/{self.grains.pk}/{self.rice.pk}/")
+        self.assertEqual(list(self.food.get_descendants()), [self.food])
+
+    def test_reparent_under_descendant_is_rejected(self):
+        self.food.parent_category = self.rice
+        with self.assertRaises(ValidationError) as raised:
+            self.food.full_clean()
+        self.assertIn('parent_category', raised.exception.message_dict)
+        with self.assertRaises(ValueError):
+            self.food.save()
+        self.grains.parent_category = self.tools
+        self.grains.full_clean()
+
+    def test_only_renames_and_moves_reindex(self):
+        with mock.patch('products.signals.reindex_products') as reindex:
+            self.grains.description = "Cereals"
+            self.grains.save()
+            self.assertFalse(reindex.called)
+            self.grains.name = "Cereals"
+            self.grains.save()
+            self.grains.parent_category = self.tools
+            self.grains.save()
+            self.assertEqual(reindex.call_count, 2)
+
+    def test_delete_reroots_children(self):
+        self.food.delete()
+        self.grains.refresh_from_db()
+        self.rice.refresh_from_db()
+        self.assertEqual(self.grains.path, f"/{self.grains.pk}/")
+        self.assertEqual(self.rice.path, f"/{self.grains.pk}/{self.rice.pk}/")
+
+    def test_tree_endpoint_single_query(self):
+        with self.assertNumQueries(1):
+            response = APIClient().get('/categories/tree/')
+        self.assertEqual(response.status_code, 200)
+        food = next(node for node in response.data if node['id'] == self.food.pk)
+        self.assertEqual(food['children'][0]['children'][0]['name'], "Rice")
+        self.assertEqual(len(response.data), 2)
+
+
+class CatalogSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        # Catalog writes bump the version on commit; run those bumps now
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = Category.objects.create(name="Grains")
+            self.product = Product.objects.create(
+                name="Rice", description="", price="10.00", stock_quantity=1, category=self.category,
+            )
+
+    def test_repeat_requests_are_served_from_snapshot(self):
+        first = self.client.get('/getallproducts/')
+        # Only the catalog version lookup; nothing is serialized again
+        with self.assertNumQueries(1):
+            second = self.client.get('/getallproducts/')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_compressed_variants(self):
+        plain = self.client.get('/getallcategories/').content
+        response = self.client.get('/getallcategories/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        if brotli is not None:
+            response = self.client.get('/getallcategories/', HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(response['Content-Encoding'], 'br')
+            self.assertEqual(brotli.decompress(response.content), plain)
+
+    def test_writes_publish_a_new_version(self):
+        version = CatalogVersion.current()
+        etag = self.client.get('/getallproducts/')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = "12.00"
+            self.product.save()
+        self.assertNotEqual(CatalogVersion.current(), version)
+        response = self.client.get('/getallproducts/')
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['price'], "12.00")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductImage.objects.create(product=self.product, image="product_images/rice.jpg")
+        self.assertEqual(len(self.client.get('/getallproducts/').json()['results'][0]['images']), 1)
+
+    def test_one_bump_per_transaction_after_commit(self):
+        version = CatalogVersion.current()
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                self.product.price = "13.00"
+                self.product.save()
+                for n in range(3):
+                    ProductImage.objects.create(product=self.product, image=f"product_images/rice-{n}.jpg")
+                # Nothing is written to the version row inside the transaction
+                self.assertEqual(CatalogVersion.current(), version)
+        with mock.patch.object(CatalogVersion, 'bump', wraps=CatalogVersion.bump) as bump:
+            for callback in callbacks:
+                callback()
+        self.assertEqual(bump.call_count, 1)
+        self.assertNotEqual(CatalogVersion.current(), version)
+
+    def test_rolled_back_write_does_not_swallow_the_next_bump(self):
+        version = CatalogVersion.current()
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ZeroDivisionError), transaction.atomic():
+                self.product.save()
+                1 / 0
+        self.assertEqual(CatalogVersion.current(), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.product.save()
+        self.assertNotEqual(CatalogVersion.current(), version)
+
+    def test_invalid_filters_are_not_cached(self):
+        self.assertEqual(self.client.get('/getallproducts/', {'sort': 'bogus'}).status_code, 400)
+        self.assertEqual(self.client.get('/getallproducts/', {'sort': 'bogus'}).status_code, 400)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        user = User.objects.create_user(
+            email="shopper@example.com", password="pass", first_name="S", last_name="H", role="customer"
+        )
+        self.client.force_authenticate(user)
+        # Catalog writes bump the version on commit; run those bumps now
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = Category.objects.create(name="Grains")
+            self.product = Product.objects.create(
+                name="Rice", description="", price="10.00", stock_quantity=1, category=self.category,
+            )
+
+    def assert_revalidates(self, url, change):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        # Only the validator query runs; nothing is serialized
+        with self.assertNumQueries(1):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        fresh = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh['ETag'], etag)
+
+    def test_product_detail(self):
+        def add_image():
+            ProductImage.objects.create(product=self.product, image="product_images/rice.jpg")
+        self.assert_revalidates(f'/products/{self.product.pk}/', add_image)
+
+    def test_product_detail_follows_category_rename(self):
+        def rename():
+            self.category.name = "Cereals"
+            self.category.save()
+        self.assert_revalidates(f'/products/{self.product.pk}/', rename)
+
+    def test_category_detail(self):
+        def reprice():
+            self.product.price = "11.00"
+            self.product.save()
+        self.assert_revalidates(f'/categories/{self.category.pk}/', reprice)
+
+    def test_catalog_lists(self):
+        def add_product():
+            Product.objects.create(name="Maize", description="", price="5.00", stock_quantity=1)
+        self.assert_revalidates('/products/', add_product)
+        self.assert_revalidates('/getallproducts/', add_product)
+        self.assert_revalidates('/getallcategories/', add_product)
+
+    def test_missing_object_still_404s(self):
+        self.assertEqual(self.client.get('/products/999999/').status_code, 404)
+
+
+def make_upload(name="photo.jpg", size=(1200, 800)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 120, 40)).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class TempMediaTestCase(TestCase):
+    """Runs with MEDIA_ROOT in a throwaway directory and a manager logged in."""
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        cache.clear()
+        self.client = APIClient()
+        self.manager = User.objects.create_user(
+            email="manager@example.com", password="pass", first_name="M", last_name="Gr", role="manager"
+        )
+        self.client.force_authenticate(self.manager)
+        self.category = Category.objects.create(name="Grains")
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+
+class ImageDerivativeTests(TempMediaTestCase):
+
+    def upload(self, *files):
+        response = self.client.post('/products/', {
+            'name': 'Rice', 'description': 'Bag', 'price': '10.00', 'stock_quantity': 3,
+            'category_id': self.category.pk, 'uploaded_images': list(files),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response
+
+    def process_and_fetch(self, product_id):
+        call_command('process_image_jobs', '--once', stdout=io.StringIO())
+        return self.client.get(f'/products/{product_id}/').data
+
+    def test_upload_returns_before_processing(self):
+        response = self.upload(make_upload(), make_upload("second.jpg"))
+        self.assertEqual([i['status'] for i in response.data['images']], ['processing'] * 2)
+        self.assertEqual(response.data['images'][0]['variants'], {})
+
+    def test_worker_generates_variants_and_srcset(self):
+        product = self.process_and_fetch(self.upload(make_upload()).data['id'])
+        image = product['images'][0]
+        self.assertEqual(image['status'], 'ready')
+        self.assertEqual(sorted(image['variants'], key=int), ['160', '480', '1024'])
+        self.assertIn(' 480w', image['srcset']['webp'])
+        self.assertTrue(image['variants']['160']['jpeg'].endswith('__w160.jpg'))
+
+        stored = ProductImage.objects.get()
+        with stored.image.storage.open(stored.variants['480']['webp']) as f:
+            self.assertEqual(Image.open(f).size, (480, 320))
+
+    def test_small_originals_are_not_upscaled(self):
+        product = Product.objects.create(name="Tiny", description="", price="1.00", stock_quantity=1)
+        image = ProductImage.objects.create(product=product, image=make_upload("tiny.jpg", (300, 200)), status='ready')
+        call_command('generate_image_derivatives', stdout=io.StringIO())
+        image.refresh_from_db()
+        self.assertEqual(sorted(image.variants, key=int), ['160'])
+
+    def test_worker_strips_exif(self):
+        buffer = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 6  # orientation: rotate 90 CW
+        exif[0x010F] = "PhoneMaker"
+        Image.new('RGB', (400, 200)).save(buffer, 'JPEG', exif=exif)
+        upload = SimpleUploadedFile("exif.jpg", buffer.getvalue(), content_type='image/jpeg')
+
+        self.process_and_fetch(self.upload(upload).data['id'])
+        stored = ProductImage.objects.get()
+        with stored.image.storage.open(stored.image.name) as f:
+            original = Image.open(f)
+            self.assertEqual(dict(original.getexif()), {})
+            self.assertEqual(original.size, (200, 400))
+
+    def test_unreadable_upload_fails_without_blocking_queue(self):
+        bogus = SimpleUploadedFile("bogus.jpg", b"not an image", content_type='image/jpeg')
+        product_id = self.upload(bogus, make_upload()).data['id']
+        product = self.process_and_fetch(product_id)
+        self.assertEqual(sorted(i['status'] for i in product['images']), ['processing', 'ready'])
+
+        # The failure waits out a growing backoff instead of being retried at once
+        failing = ProductImage.objects.get(status='processing')
+        waits = []
+        for attempt in range(1, jobs.MAX_ATTEMPTS):
+            self.assertEqual(failing.attempts, attempt)
+            waits.append(failing.next_attempt_at - timezone.now())
+            self.assertIsNone(jobs.claim_next_image())
+            with mock.patch('products.jobs.timezone.now', return_value=failing.next_attempt_at):
+                self.assertEqual(jobs.run_pending(), 1)
+            failing.refresh_from_db()
+        self.assertGreater(waits[1], waits[0] * 1.5)
+
+        product = self.process_and_fetch(product_id)
+        self.assertEqual(sorted(i['status'] for i in product['images']), ['failed', 'ready'])
+        self.assertFalse(ProductImage.objects.filter(status='processing').exists())
+
+    @skipIf('heic' in IMAGE_EXTENSIONS, "a HEIF plugin for Pillow is installed")
+    def test_formats_pillow_cannot_open_are_rejected(self):
+        upload = SimpleUploadedFile("photo.heic", b"\x00\x00\x00\x18ftypheic", content_type='image/heic')
+        response = self.client.post('/products/', {
+            'name': 'Rice', 'description': 'Bag', 'price': '10.00', 'stock_quantity': 3,
+            'category_id': self.category.pk, 'uploaded_images': [upload],
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+    def test_worker_survives_database_errors(self):
+        command = 'products.management.commands.process_image_jobs'
+        stderr = io.StringIO()
+        with mock.patch(f'{command}.run_pending', side_effect=[DatabaseError("server closed the connection"), 2,
+                                                                KeyboardInterrupt]) as run_pending, \
+                mock.patch(f'{command}.time.sleep'), \
+                mock.patch(f'{command}.close_old_connections') as close_old_connections:
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('process_image_jobs', '--sleep', '0', stdout=io.StringIO(), stderr=stderr)
+        self.assertEqual(run_pending.call_count, 3)
+        self.assertEqual(close_old_connections.call_count, 2)
+        self.assertIn("server closed the connection", stderr.getvalue())
+
+    def test_upload_count_is_limited(self):
+        response = self.client.post('/products/', {
+            'name': 'Rice', 'description': 'Bag', 'price': '10.00', 'stock_quantity': 3,
+            'category_id': self.category.pk,
+            'uploaded_images': [make_upload(f"{n}.jpg", (10, 10)) for n in range(11)],
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+
+class ContentAddressedImageTests(TempMediaTestCase):
+    def upload_for(self, name, data):
+        response = self.client.post('/products/', {
+            'name': name, 'description': 'Bag', 'price': '10.00', 'stock_quantity': 1,
+            'category_id': self.category.pk,
+            'uploaded_images': [SimpleUploadedFile(f"{name}.jpg", data, content_type='image/jpeg')],
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Product.objects.get(pk=response.data['id'])
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root)
+            for root, _, names in os.walk(self.media_root) for name in names
+        )
+
+    def test_identical_uploads_share_one_blob_and_derivatives(self):
+        data = make_upload().read()
+        first = self.upload_for("rice", data)
+        call_command('process_image_jobs', '--once', stdout=io.StringIO())
+        second = self.upload_for("rice-5kg", data)
+
+        a, b = first.images.get(), second.images.get()
+        self.assertEqual(a.image.name, b.image.name)
+        self.assertIn(a.content_hash, a.image.name)
+        # The duplicate reuses the processed derivatives without a worker pass
+        self.assertEqual(b.status, 'ready')
+        self.assertEqual(a.variants, b.variants)
+        self.assertEqual(len(self.stored_files()), 1 + 6)
+
+    def test_pending_duplicates_are_processed_once(self):
+        data = make_upload().read()
+        self.upload_for("rice", data)
+        self.upload_for("rice-5kg", data)
+        call_command('process_image_jobs', '--once', stdout=io.StringIO())
+        self.assertEqual(set(ProductImage.objects.values_list('status', flat=True)), {'ready'})
+        self.assertEqual(len(self.stored_files()), 1 + 6)
+
+    def test_stripping_stores_a_new_blob_and_releases_the_shared_original(self):
+        buffer = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = "PhoneMaker"
+        Image.new('RGB', (400, 200)).save(buffer, 'JPEG', exif=exif)
+        data = buffer.getvalue()
+        first = self.upload_for("rice", data)
+        second = self.upload_for("rice-5kg", data)
+        original = first.images.get().image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('process_image_jobs', '--once', stdout=io.StringIO())
+
+        a, b = first.images.get(), second.images.get()
+        self.assertEqual(a.image.name, b.image.name)
+        self.assertNotEqual(a.image.name, original)
+        self.assertNotIn(original, self.stored_files())
+        self.assertEqual(len(self.stored_files()), 1 + 2)  # stripped blob + its 160px WebP/JPEG
+        # Uploading the same bytes again reuses the stripped copy as it is
+        third = self.upload_for("rice-10kg", data).images.get()
+        self.assertEqual((third.image.name, third.status), (a.image.name, 'ready'))
+
+    def test_force_regenerates_each_shared_file_once_in_place(self):
+        data = make_upload().read()
+        first = self.upload_for("rice", data)
+        call_command('process_image_jobs', '--once', stdout=io.StringIO())
+        self.upload_for("rice-5kg", data)
+        pending = self.upload_for("maize", make_upload(size=(600, 400)).read()).images.get()
+        files = self.stored_files()
+        variants = first.images.get().variants
+
+        storage = ProductImage._meta.get_field('image').storage
+        with mock.patch('products.management.commands.generate_image_derivatives.generate_derivatives',
+                        wraps=generate_derivatives) as generate, \
+                mock.patch.object(storage, 'delete') as delete:
+            call_command('generate_image_derivatives', '--force', stdout=io.StringIO())
+        self.assertEqual(generate.call_count, 1)  # the two rice rows share one file; maize is pending
+        delete.assert_not_called()
+        self.assertEqual(self.stored_files(), files)
+        for row_variants in ProductImage.objects.filter(status='ready').values_list('variants', flat=True):
+            self.assertEqual(row_variants, variants)
+        pending.refresh_from_db()
+        self.assertEqual((pending.status, pending.variants), ('processing', {}))
+
+    def test_last_reference_deletes_blob(self):
+        data = make_upload().read()
+        first = self.upload_for("rice", data)
+        second = self.upload_for("rice-5kg", data)
+        call_command('process_image_jobs', '--once', stdout=io.StringIO())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(len(self.stored_files()), 1 + 6)
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(self.stored_files(), [])
+
+
+class ProductImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.manager = User.objects.create_user(
+            email="manager@example.com", password="pass", first_name="M", last_name="Gr", role="manager"
+        )
+        self.client.force_authenticate(self.manager)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.grains = Category.objects.create(name="Grains", slug="grains")
+            Product.objects.create(name="Rice", description="", price="10.00", stock_quantity=1, sku="RICE-1")
+
+    def test_csv_import_reports_row_errors(self):
+        body = (
+            "name,description,price,stock_quantity,category,sku\n"
+            "Maize flour,Fine white ufa,8.5,10,grains,\n"
+            "Millet,,4,2,,MILLET-1\n"
+            ",,1,1,,\n"
+            "Sorghum,,abc,1,,\n"
+            "Beans,,3,1,pulses,\n"
+            "Rice again,,3,1,,RICE-1\n"
+        )
+        version = CatalogVersion.current()
+        response = self.client.generic('POST', '/products/import/', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [4, 5, 6, 7])
+
+        maize = Product.objects.get(name="Maize flour")
+        self.assertEqual(maize.category, self.grains)
+        self.assertTrue(maize.sku.startswith("SKU-"))
+        self.assertNotEqual(CatalogVersion.current(), version)
+        # Imported rows are searchable even though bulk_create skips signals
+        ids = [item['id'] for item in self.client.get('/products/search/', {'q': 'ufa'}).data['results']]
+        self.assertEqual(ids, [maize.pk])
+
+    def test_non_finite_and_oversized_values_are_row_errors(self):
+        body = (
+            "name,price,stock_quantity\n"
+            "A,NaN,1\n"
+            "B,Infinity,1\n"
+            "C,-inf,1\n"
+            "D,sNaN,1\n"
+            "E,1,99999999999\n"
+            "F,1E+400,1\n"
+            "G,2.5,3\n"
+        )
+        response = self.client.generic('POST', '/products/import/', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3, 4, 5, 6, 7])
+
+    def test_excel_byte_order_mark_is_ignored(self):
+        body = "\ufeffname,price,stock_quantity\nMillet,4,2\n".encode('utf-8')
+        response = self.client.generic('POST', '/products/import/', body, content_type='text/csv')
+        self.assertEqual((response.data['created'], response.data['errors']), (1, []))
+
+        with tempfile.NamedTemporaryFile('wb', suffix='.csv', delete=False) as handle:
+            handle.write("\ufeffname,price,stock_quantity\nSorghum,3,1\n".encode('utf-8'))
+        self.addCleanup(os.remove, handle.name)
+        call_command('import_products', handle.name, stdout=io.StringIO())
+        self.assertTrue(Product.objects.filter(name="Sorghum").exists())
+
+    def test_jsonl_command_batches_inserts(self):
+        lines = [
+            '{"name": "Item %d", "price": "1.00", "stock_quantity": 1, "category": "grains"}' % n
+            for n in range(25)
+        ] + ['not json', '{"name": "Dup", "price": 1, "sku": "DUP"}', '{"name": "Dup", "price": 1, "sku": "DUP"}']
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as handle:
+            handle.write('\n'.join(lines))
+        self.addCleanup(os.remove, handle.name)
+
+        out, err = io.StringIO(), io.StringIO()
+        # Category map + version bump, then per batch of 10: SKU checks, insert (in a savepoint), FTS refresh
+        with self.assertNumQueries(21):
+            call_command('import_products', handle.name, '--batch-size', '10', stdout=out, stderr=err)
+        self.assertIn("Imported 26 products (2 rows rejected)", out.getvalue())
+        self.assertEqual(Product.objects.filter(category=self.grains).count(), 25)
+        self.assertEqual(len(set(Product.objects.values_list('sku', flat=True))), 27)
+
+    def test_requires_manager(self):
+        customer = User.objects.create_user(
+            email="c@example.com", password="pass", first_name="C", last_name="U", role="customer"
+        )
+        self.client.force_authenticate(customer)
+        response = self.client.generic('POST', '/products/import/', "name,price\nA,1\n", content_type='text/csv')
+        self.assertEqual(response.status_code, 403)
+        self.client.force_authenticate(self.manager)
+        response = self.client.generic('POST', '/products/import/', "{}", content_type='application/json')
+        self.assertEqual(response.status_code, 415)
+
+
+class ProductBulkUpdateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.manager = User.objects.create_user(
+            email="manager@example.com", password="pass", first_name="M", last_name="Gr", role="manager"
+        )
+        self.client.force_authenticate(self.manager)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products = [
+                Product.objects.create(name=f"Item {n}", description="", price="1.00", stock_quantity=1, sku=f"IT-{n}")
+                for n in range(6)
+            ]
+
+    def test_updates_by_id_and_sku(self):
+        first, second = self.products[:2]
+        version = CatalogVersion.current()
+        records = [
+            {'id': first.pk, 'price': "2.50", 'stock_quantity': 0},
+            {'sku': second.sku, 'is_active': False},
+            {'sku': 'MISSING', 'price': 1},
+            {'id': first.pk, 'price': "-1"},
+            {'price': 1},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/products/bulk-update/', records, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['updated', 'updated', 'error', 'error', 'error'])
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((str(first.price), first.stock_quantity), ("2.50", 0))
+        self.assertFalse(second.is_active)
+        self.assertGreater(first.updated_at, self.products[2].updated_at)
+        self.assertNotEqual(CatalogVersion.current(), version)
+
+    def test_non_finite_price_is_a_row_error(self):
+        first, second = self.products[:2]
+        records = [
+            {'id': first.pk, 'price': "NaN"},
+            {'id': first.pk, 'price': "Infinity"},
+            {'sku': second.sku, 'stock_quantity': 10 ** 12},
+            {'sku': second.sku, 'price': "4.00"},
+        ]
+        response = self.client.post('/products/bulk-update/', records, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['error', 'error', 'error', 'updated'])
+        second.refresh_from_db()
+        self.assertEqual((str(second.price), second.stock_quantity), ("4.00", 1))
+
+    def test_only_sent_fields_are_written(self):
+        first, second = self.products[:2]
+        # Stock reserved by an order after the batch read its rows
+        real_bulk_update = Product.objects.bulk_update
+
+        def reserve_then_update(objs, fields, **kwargs):
+            Product.objects.filter(pk__in=[first.pk, second.pk]).update(stock_quantity=0)
+            return real_bulk_update(objs, fields, **kwargs)
+
+        records = [{'id': first.pk, 'price': "3.00"}, {'id': second.pk, 'price': "4.00", 'is_active': False}]
+        with mock.patch.object(Product.objects, 'bulk_update', side_effect=reserve_then_update) as bulk_update:
+            response = self.client.post('/products/bulk-update/', records, format='json')
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(sorted(sorted(call.args[1]) for call in bulk_update.call_args_list),
+                         [['is_active', 'price', 'updated_at'], ['price', 'updated_at']])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((str(first.price), first.stock_quantity), ("3.00", 0))
+        self.assertEqual((str(second.price), second.stock_quantity, second.is_active), ("4.00", 0, False))
+
+    def test_out_of_range_id_is_a_row_error(self):
+        records = [{'id': 10 ** 20, 'price': 1}, {'id': 0, 'price': 1}, {'id': self.products[0].pk, 'price': 2}]
+        response = self.client.post('/products/bulk-update/', records, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.data['results']], ['error', 'error', 'updated'])
+
+    def test_queries_scale_with_batches_not_rows(self):
+        records = [{'sku': product.sku, 'stock_quantity': 9} for product in self.products]
+        # Per batch of 3: lookup and bulk UPDATE; plus the transaction savepoint pair.
+        # The catalog version is bumped once, after commit.
+        with mock.patch.object(CatalogVersion, 'bump') as bump, self.captureOnCommitCallbacks(execute=True), \
+                self.assertNumQueries(6):
+            call_command('bulk_update_products', self.write(records), '--batch-size', '3', stdout=io.StringIO())
+        self.assertEqual(bump.call_count, 1)
+        self.assertEqual(set(Product.objects.values_list('stock_quantity', flat=True)), {9})
+
+    def write(self, records):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as handle:
+            handle.write('\n'.join(json.dumps(record) for record in records))
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
+
+    def test_requires_manager_and_records(self):
+        self.assertEqual(self.client.post('/products/bulk-update/', [], format='json').status_code, 400)
+        customer = User.objects.create_user(
+            email="c@example.com", password="pass", first_name="C", last_name="U", role="customer"
+        )
+        self.client.force_authenticate(customer)
+        response = self.client.post('/products/bulk-update/', [{'id': 1, 'price': 1}], format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class FastSerializationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        grains = Category.objects.create(name="Grains", description="Maize, rice and more")
+        Category.objects.create(name="Empty", parent_category=grains)
+        for n in range(5):
+            product = Product.objects.create(
+                name=f"Ufa wa chimanga {n} é\U0001F33D", description='Line "one"\nline\ttwo',
+                price=f"{n * 1000}.5", stock_quantity=n, category=grains if n % 2 else None,
+            )
+            ProductImage.objects.create(
+                product=product, image=f"product_images/p{n} x.jpg", status='ready',
+                variants={"160": {"webp": f"product_images/p{n} x__w160.webp", "jpeg": f"product_images/p{n} x__w160.jpg"},
+                          "480": {"webp": f"product_images/p{n} x__w480.webp"}},
+            )
+            ProductImage.objects.create(product=product, image=f"product_images/q{n}.png")
+
+    def both(self, url, params=None):
+        responses = []
+        for fast in (False, True):
+            cache.clear()
+            with self.settings(PRODUCT_FAST_SERIALIZATION=fast):
+                response = self.client.get(url, params or {})
+            self.assertEqual(response.status_code, 200)
+            responses.append(response.content)
+        return responses
+
+    def test_catalog_snapshots_are_byte_identical(self):
+        cases = [
+            ('/getallproducts/', {}),
+            ('/getallproducts/', {'sort': 'price', 'page_size': 2}),
+            ('/getallproducts/', {'sort': '-price', 'facets': 'true'}),
+            ('/getallcategories/', {}),
+            ('/getallcategories/', {'include': 'products', 'page_size': 2}),
+        ]
+        for url, params in cases:
+            with self.subTest(url=url, params=params):
+                slow, fast = self.both(url, params)
+                self.assertEqual(slow, fast)
+
+    def test_cursor_pages_match(self):
+        slow, fast = self.both('/getallproducts/', {'page_size': 2})
+        cursor_url = json.loads(fast)['next']
+        slow, fast = self.both(cursor_url)
+        self.assertEqual(slow, fast)
+        self.assertEqual(len(json.loads(fast)['results']), 2)
+
+    def test_authenticated_list_endpoints_match(self):
+        self.client.force_authenticate(User.objects.create_user(
+            email="c@example.com", password="pass", first_name="C", last_name="U", role="customer"
+        ))
+        for url in ('/products/', '/categories/'):
+            with self.subTest(url=url):
+                slow, fast = self.both(url)
+                self.assertEqual(slow, fast)
+
+
+class PrimaryImageTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(
+            email="manager@example.com", password="pass", first_name="M", last_name="Gr", role="manager"
+        ))
+        self.product = Product.objects.create(name="Rice", description="", price="10.00", stock_quantity=1)
+        self.first = ProductImage.objects.create(product=self.product, image="product_images/a.jpg")
+        self.second = ProductImage.objects.create(product=self.product, image="product_images/b.jpg")
+
+    def cover(self):
+        return Product.objects.values_list('primary_image', flat=True).get(pk=self.product.pk)
+
+    def test_first_upload_becomes_cover_and_deletes_fall_back(self):
+        self.assertEqual(self.cover(), self.first.pk)
+        self.first.delete()
+        self.assertEqual(self.cover(), self.second.pk)
+        self.second.delete()
+        self.assertIsNone(self.cover())
+
+    def test_set_as_cover(self):
+        response = self.client.post(f'/products/{self.product.pk}/cover/', {'image_id': self.second.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['primary_image'], self.second.pk)
+        # Adding more images keeps an explicit cover
+        ProductImage.objects.create(product=self.product, image="product_images/c.jpg")
+        self.assertEqual(self.cover(), self.second.pk)
+
+        other = Product.objects.create(name="Maize", description="", price="5.00", stock_quantity=1)
+        foreign = ProductImage.objects.create(product=other, image="product_images/d.jpg")
+        response = self.client.post(f'/products/{self.product.pk}/cover/', {'image_id': foreign.pk}, format='json')
+        self.assertEqual(response.status_code, 404)
+        with self.assertRaises(ValidationError):
+            self.product.set_primary_image(foreign)
+
+    def test_cover_input_and_role_are_checked(self):
+        url = f'/products/{self.product.pk}/cover/'
+        for body in ({}, {'image_id': 'abc'}, {'image_id': 0}, {'image_id': [1]}):
+            with self.subTest(body=body):
+                self.assertEqual(self.client.post(url, body, format='json').status_code, 400)
+        self.client.force_authenticate(User.objects.create_user(
+            email="c@example.com", password="pass", first_name="C", last_name="U", role="customer"
+        ))
+        response = self.client.post(url, {'image_id': self.second.pk}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.cover(), self.first.pk)
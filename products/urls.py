@@ -2,19 +2,29 @@ from django.urls import path
 from .views import (
     CategoryListCreateView,
     CategoryDetailView,
+    CategoryTreeView,
     ProductListCreateView,
     ProductDetailView,
-    ManagerDashboardView,GetAllProductsView, GetAllCategoriesView  # Import the dashboard view
+    ManagerDashboardView,GetAllProductsView, GetAllCategoriesView,  # Import the dashboard view
+    ProductSearchView,
+    ProductImportView,
+    ProductBulkUpdateView,
+    ProductCoverView,
 )
 
 urlpatterns = [
     # Category endpoints
     path('categories/', CategoryListCreateView.as_view(), name='category-list-create'),
+    path('categories/tree/', CategoryTreeView.as_view(), name='category-tree'),
     path('categories/<int:pk>/', CategoryDetailView.as_view(), name='category-detail'),
 
     # Product endpoints
     path('products/', ProductListCreateView.as_view(), name='product-list-create'),
+    path('products/search/', ProductSearchView.as_view(), name='product-search'),
+    path('products/import/', ProductImportView.as_view(), name='product-import'),
+    path('products/bulk-update/', ProductBulkUpdateView.as_view(), name='product-bulk-update'),
     path('products/<int:pk>/', ProductDetailView.as_view(), name='product-detail'),
+    path('products/<int:pk>/cover/', ProductCoverView.as_view(), name='product-cover'),
 
     # Manager dashboard endpoint
     path('manager-dashboard/', ManagerDashboardView.as_view(), name='manager-dashboard'),
@@ -1,5 +1,5 @@
 from django.shortcuts import get_object_or_404
-from django.db.models import Sum, F
+from django.db.models import Sum, F, Prefetch, Count, Max
 from django.contrib.auth import get_user_model
 from datetime import datetime
 from calendar import month_name
@@ -8,27 +8,117 @@ from rest_framework.authentication import SessionAuthentication, BasicAuthentica
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, parsers
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.permissions import IsAuthenticated
 
-from .models import Category, Product
-from .serializers import CategorySerializer, ProductSerializer
+from .models import Category, Product, ProductImage
+from .conditional import aggregate_etag, conditional_get, latest
+from . import fastpath
+from .filters import ProductFilter, product_facets
+from .importer import DEFAULT_BATCH_SIZE, ProductImporter, decode_lines, read_rows
+from .inventory import MAX_RECORDS, bulk_update_products
+from .pagination import KeysetPagination
+from .search import search_product_ids
+from .snapshot import catalog_response, catalog_state
+from .serializers import (
+    CategorySerializer, CategorySummarySerializer, CategoryLatestProductsSerializer, ProductCoverSerializer,
+    ProductSerializer,
+)
 from orderediterm.models import Order, OrderItem
 from orderediterm.serializers import RecentOrderSerializer
 
 User = get_user_model()
 
 
+# ----------------- CONDITIONAL GET VALIDATORS ------------------
+
+def product_detail_state(request, pk):
+    row = Product.objects.filter(pk=pk).values_list('updated_at', 'category__updated_at').first()
+    if row is None:
+        return None, None
+    return aggregate_etag(f'product-{pk}', *row), latest(*row)
+
+
+def category_detail_state(request, pk):
+    row = (
+        Category.objects.filter(pk=pk)
+        .annotate(product_count=Count('products'), products_updated_at=Max('products__updated_at'))
+        .values_list('updated_at', 'product_count', 'products_updated_at')
+        .first()
+    )
+    if row is None:
+        return None, None
+    updated_at, product_count, products_updated_at = row
+    etag = aggregate_etag(f'category-{pk}', updated_at, product_count, products_updated_at)
+    return etag, latest(updated_at, products_updated_at)
+
+
 # ----------------- CATEGORY VIEWS ------------------
 
+def category_list_response(request):
+    """
+    Shared GET for the category list endpoints. By default each category is
+    a summary (product count, price range, cover image) from one query.
+    ?include=products embeds each category's newest products instead: one
+    page (?page_size=) per category, with a `products_next` link (the same
+    list narrowed to that category by ?category=, plus a cursor) for the rest.
+    """
+    if request.query_params.get('include') != 'products':
+        categories = CategorySummarySerializer.setup_eager_loading(Category.objects.all())
+        if fastpath.enabled():
+            return Response(fastpath.category_summary_data(categories, request), status=status.HTTP_200_OK)
+        serializer = CategorySummarySerializer(categories, many=True, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    if 'category' in request.query_params:
+        # Following a products_next link: the rest of one category's products
+        category_id = request.query_params['category']
+        if not category_id.isdigit():
+            raise NotFound('Invalid category')
+        return Response([category_page_data(request, get_object_or_404(Category, pk=category_id))])
+
+    limit = KeysetPagination().get_page_size(request)
+
+    def next_link(category_id, products):
+        # One row past the page was read; if it's there, the category continues
+        if len(products) <= limit:
+            return None
+        url = replace_query_param(request.build_absolute_uri(), 'category', category_id)
+        return KeysetPagination().get_resume_link(url, products[limit - 1], limit)
+
+    if fastpath.enabled():
+        return Response(fastpath.category_products_data(limit, request, next_link), status=status.HTTP_200_OK)
+    products = ProductSerializer.setup_eager_loading(
+        Product.objects.order_by('-created_at', '-id')
+    )[:limit + 1]
+    categories = list(Category.objects.prefetch_related(
+        Prefetch('products', queryset=products, to_attr='latest_products')
+    ))
+    for category in categories:
+        category.products_next = next_link(category.pk, category.latest_products)
+        category.latest_products = category.latest_products[:limit]
+    serializer = CategoryLatestProductsSerializer(categories, many=True, context={'request': request})
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+def category_page_data(request, category):
+    """A category with one keyset page of its products (?cursor=, ?page_size=) and products_next."""
+    paginator = KeysetPagination()
+    products = ProductSerializer.setup_eager_loading(category.products.all())
+    category.latest_products = paginator.paginate_queryset(products, request)
+    category.products_next = paginator.get_next_link()
+    return CategoryLatestProductsSerializer(category, context={'request': request}).data
+
+
 class CategoryListCreateView(APIView):
     """
-    GET: List all categories (NO authentication required).
+    GET: List category summaries, or ?include=products for embedded products (NO authentication required).
     POST: Create a new category.
     """
+    @conditional_get(catalog_state('category-list'))
     def get(self, request):
-        categories = Category.objects.all()
-        serializer = CategorySerializer(categories, many=True, context={'request': request})
-        return Response(serializer.data)
+        return category_list_response(request)
 
     def post(self, request):
         serializer = CategorySerializer(data=request.data, context={'request': request})
@@ -38,26 +128,44 @@ class CategoryListCreateView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class CategoryTreeView(APIView):
+    """GET: Return the full nested category tree from one query (NO authentication required)."""
+    authentication_classes = []  # Disable global authentication
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        nodes = {}
+        roots = []
+        # Ordering by path puts every parent before its children
+        for row in Category.objects.order_by('path').values(
+            'id', 'name', 'slug', 'description', 'parent_category_id'
+        ):
+            parent_id = row.pop('parent_category_id')
+            node = nodes[row['id']] = {**row, 'children': []}
+            parent = nodes.get(parent_id)
+            (parent['children'] if parent else roots).append(node)
+        return Response(roots, status=status.HTTP_200_OK)
+
+
 class CategoryDetailView(APIView):
     """
-    GET: Retrieve details of a category by ID (NO authentication required).
+    GET: Retrieve details of a category by ID with one page of its products,
+    newest first; follow `products_next` for more (NO authentication required).
     PUT: Update a category (protected).
     DELETE: Delete a category (protected).
     """
     def get_object(self, pk):
         return get_object_or_404(Category, pk=pk)
 
+    @conditional_get(category_detail_state)
     def get(self, request, pk):
-        category = self.get_object(pk)
-        serializer = CategorySerializer(category, context={'request': request})
-        return Response(serializer.data)
+        return Response(category_page_data(request, self.get_object(pk)))
 
     def put(self, request, pk):
         category = self.get_object(pk)
         serializer = CategorySerializer(category, data=request.data, context={'request': request})
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
+            return Response(category_page_data(request, serializer.save()))
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, pk):
@@ -68,17 +176,42 @@ class CategoryDetailView(APIView):
 
 # ----------------- PRODUCT VIEWS ------------------
 
+def filtered_product_page(request, view=None):
+    """
+    Shared GET for the product list endpoints: apply ProductFilter, then
+    return one keyset page. Pass ?facets=true to also get category and
+    price-bucket counts for the filtered set (usually only on page one).
+    """
+    filterset = ProductFilter(request.query_params, queryset=Product.objects.all())
+    if not filterset.is_valid():
+        return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    paginator = KeysetPagination()
+    paginator.ordering = filterset.ordering
+    if fastpath.enabled():
+        rows = paginator.paginate_queryset(filterset.qs.values(*fastpath.PRODUCT_VALUES), request, view=view)
+        response = paginator.get_paginated_response(fastpath.product_list_data(rows, request))
+    else:
+        products = ProductSerializer.setup_eager_loading(filterset.qs)
+        page = paginator.paginate_queryset(products, request, view=view)
+        serializer = ProductSerializer(page, many=True, context={'request': request})
+        response = paginator.get_paginated_response(serializer.data)
+
+    if request.query_params.get('facets') in ('true', '1'):
+        response.data['facets'] = product_facets(filterset.qs)
+    return response
+
+
 class ProductListCreateView(APIView):
     """
-    GET: List all products (NO authentication required).
+    GET: List products, filtered and paginated by cursor (NO authentication required).
     POST: Create a new product.
     """
     parser_classes = [parsers.MultiPartParser, parsers.FormParser]
 
+    @conditional_get(catalog_state('product-list'))
     def get(self, request):
-        products = Product.objects.all()
-        serializer = ProductSerializer(products, many=True, context={'request': request})
-        return Response(serializer.data)
+        return filtered_product_page(request, view=self)
 
     def post(self, request):
         serializer = ProductSerializer(data=request.data, context={'request': request})
@@ -98,8 +231,9 @@ class ProductDetailView(APIView):
     parser_classes = [parsers.MultiPartParser, parsers.FormParser]
 
     def get_object(self, pk):
-        return get_object_or_404(Product, pk=pk)
+        return get_object_or_404(ProductSerializer.setup_eager_loading(Product.objects.all()), pk=pk)
 
+    @conditional_get(product_detail_state)
     def get(self, request, pk):
         product = self.get_object(pk)
         serializer = ProductSerializer(product, context={'request': request})
@@ -110,6 +244,8 @@ class ProductDetailView(APIView):
         serializer = ProductSerializer(product, data=request.data, context={'request': request})
         if serializer.is_valid():
             product = serializer.save()
+            # Newly uploaded images aren't in the prefetched set; drop it (as DRF's UpdateModelMixin does)
+            product._prefetched_objects_cache = {}
             return Response(ProductSerializer(product, context={'request': request}).data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -119,26 +255,144 @@ class ProductDetailView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class ProductCoverView(APIView):
+    """
+    POST: Make one of the product's images its cover ({"image_id": ...}).
+    The cover is what carts, wishlists and listings show first (Protected, managers only).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        if not hasattr(request.user, 'role') or request.user.role not in ['manager', 'admin']:
+            return Response({'detail': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
+
+        serializer = ProductCoverSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        product = get_object_or_404(Product, pk=pk)
+        image = get_object_or_404(ProductImage, pk=serializer.validated_data['image_id'], product=product)
+        product.set_primary_image(image)
+        product = get_object_or_404(ProductSerializer.setup_eager_loading(Product.objects.all()), pk=pk)
+        return Response(ProductSerializer(product, context={'request': request}).data)
+
+
+# ----------------- PRODUCT SEARCH (NO AUTH) ------------------
+
+class ProductSearchView(APIView):
+    """
+    GET: Ranked full-text search over product name, description and category name.
+    Query params: q (required), page_size (optional, capped like the product list).
+    """
+    authentication_classes = []  # Disable global authentication
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'detail': "Query parameter 'q' is required."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        limit = KeysetPagination().get_page_size(request)
+        ids = search_product_ids(query, limit)
+        products = ProductSerializer.setup_eager_loading(Product.objects.filter(pk__in=ids))
+        position = {pk: index for index, pk in enumerate(ids)}
+        ranked = sorted(products, key=lambda product: position[product.pk])
+        serializer = ProductSerializer(ranked, many=True, context={'request': request})
+        return Response({'query': query, 'results': serializer.data}, status=status.HTTP_200_OK)
+
+
 # ----------------- GET ALL PRODUCTS & CATEGORIES (NO AUTH) ------------------
 
 class GetAllProductsView(APIView):
-    """GET: Return all products without authentication."""
+    """
+    GET: Return products without authentication, filtered and paginated by cursor.
+    Served from the precompressed catalog snapshot cache.
+    """
     authentication_classes = []  # Disable global authentication
     permission_classes = [AllowAny]
     def get(self, request):
-        products = Product.objects.all()
-        serializer = ProductSerializer(products, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return catalog_response(request, 'products', lambda: filtered_product_page(request, view=self))
 
 
 class GetAllCategoriesView(APIView):
-    """GET: Return all categories without authentication."""
+    """
+    GET: Return category summaries (or ?include=products) without authentication.
+    Served from the precompressed catalog snapshot cache.
+    """
     authentication_classes = []  # Disable global authentication
     permission_classes = [AllowAny]
     def get(self, request):
-        categories = Category.objects.all()
-        serializer = CategorySerializer(categories, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return catalog_response(request, 'categories', lambda: category_list_response(request))
+
+
+# ----------------- BULK PRODUCT IMPORT (MANAGER) ------------------
+
+IMPORT_CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+    'application/x-jsonlines': 'jsonl',
+}
+
+
+class ProductImportView(APIView):
+    """
+    POST: Bulk-create products from a raw CSV (text/csv) or JSON Lines
+    (application/x-ndjson) request body, read as a stream. Columns: name,
+    description, price, stock_quantity, category (slug), is_active, sku.
+    Returns the created count and per-row errors (Protected, managers only).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if request.user.role not in ['manager', 'admin']:
+            return Response({'detail': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
+
+        content_type = request.content_type.split(';')[0].strip().lower()
+        fmt = IMPORT_CONTENT_TYPES.get(content_type)
+        if fmt is None:
+            return Response(
+                {'detail': f"Content-Type must be one of: {', '.join(IMPORT_CONTENT_TYPES)}."},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+        if request.stream is None:
+            return Response({'detail': 'Request body is empty.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            batch_size = min(int(request.query_params.get('batch_size', DEFAULT_BATCH_SIZE)), 5000)
+        except ValueError:
+            batch_size = DEFAULT_BATCH_SIZE
+        try:
+            report = ProductImporter(batch_size=max(batch_size, 1)).run(
+                read_rows(decode_lines(request.stream), fmt)
+            )
+        except UnicodeDecodeError:
+            return Response({'detail': 'Request body must be UTF-8 encoded.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_201_CREATED if report['created'] else status.HTTP_200_OK)
+
+
+class ProductBulkUpdateView(APIView):
+    """
+    POST: Apply price / stock_quantity / is_active changes to many products
+    at once. Body is a JSON list (or {"records": [...]}) of records keyed by
+    `id` or `sku`; returns one result per record (Protected, managers only).
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [parsers.JSONParser]
+
+    def post(self, request):
+        if request.user.role not in ['manager', 'admin']:
+            return Response({'detail': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
+
+        records = request.data.get('records') if isinstance(request.data, dict) else request.data
+        if not isinstance(records, list) or not records:
+            return Response({'detail': 'Send a non-empty list of update records.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(records) > MAX_RECORDS:
+            return Response({'detail': f'At most {MAX_RECORDS} records per request.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(bulk_update_products(records), status=status.HTTP_200_OK)
 
 
 # ----------------- MANAGER DASHBOARD VIEW ------------------
@@ -187,7 +441,7 @@ class ManagerDashboardView(APIView):
         revenue_labels = [item['product__category__name'] or 'Uncategorized' for item in revenue_by_cat_qs]
         revenue_data = [float(item['revenue']) for item in revenue_by_cat_qs]
 
-        recent_orders_qs = Order.objects.select_related('user').order_by('-created_at')[:5]
+        recent_orders_qs = RecentOrderSerializer.setup_eager_loading(Order.objects.all()).order_by('-created_at')[:5]
         recent_orders = RecentOrderSerializer(recent_orders_qs, many=True).data
 
         top_products_qs = (
@@ -33,7 +33,7 @@ const CartView = () => {
       const { data } = await api.get('/cart/', {
         headers: { Authorization: `Bearer ${localStorage.getItem('access')}` }
       });
-      setCart(data);
+      setCart(data.items);
     } catch {
       Swal.fire('Error', 'Failed to load cart items.', 'error');
     } finally {
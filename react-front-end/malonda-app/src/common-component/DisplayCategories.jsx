@@ -10,9 +10,12 @@ const DisplayCategories = () => {
   const [categories, setCategories] = useState([]);
   const navigate = useNavigate();
 
-  // Use Axios GET for categories
+  // Use Axios GET for categories; the plain list is summaries only, so ask
+  // for the two newest products of each category to preview
   useEffect(() => {
-    axios.get('https://valid-brittan-malonda-024dca75.koyeb.app/getallcategories/')
+    axios.get('https://valid-brittan-malonda-024dca75.koyeb.app/getallcategories/', {
+      params: { include: 'products', page_size: 2 }
+    })
       .then(res => {
         setCategories(res.data);
         Swal.fire({
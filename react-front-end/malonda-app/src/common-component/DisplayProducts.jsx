@@ -13,13 +13,18 @@ import './DisplayProducts.css';
 const DisplayProducts = () => {
   const [products, setProducts] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [nextPage, setNextPage] = useState(null);
   const [filter, setFilter] = useState('all');
   const [searchTerm, setSearch] = useState('');
 
-  // Using direct axios GET
-  useEffect(() => {
-    axios.get('https://valid-brittan-malonda-024dca75.koyeb.app/getallproducts/')
-      .then(res => setProducts(res.data))
+  // The list is paginated: {next, first, results}; `next` is null on the last page
+  const loadPage = (url, append) =>
+    axios.get(url)
+      .then(res => {
+        setProducts(prev => (append ? [...prev, ...res.data.results] : res.data.results));
+        setNextPage(res.data.next);
+      })
       .catch(() =>
         Swal.fire({
           icon: 'error',
@@ -29,10 +34,19 @@ const DisplayProducts = () => {
           color: '#f8fafc',
           confirmButtonColor: '#3b82f6'
         })
-      )
+      );
+
+  // Using direct axios GET
+  useEffect(() => {
+    loadPage('https://valid-brittan-malonda-024dca75.koyeb.app/getallproducts/', false)
       .finally(() => setLoading(false));
   }, []);
 
+  const loadMore = () => {
+    setLoadingMore(true);
+    loadPage(nextPage, true).finally(() => setLoadingMore(false));
+  };
+
   const imgUrl = (src) =>
     src || 'https://via.placeholder.com/600x450?text=No+Image';
 
@@ -193,6 +207,14 @@ const DisplayProducts = () => {
             ))}
           </div>
         )}
+
+        {nextPage && (
+          <div className="load-more">
+            <button className="load-more-button" onClick={loadMore} disabled={loadingMore}>
+              {loadingMore ? 'Loading…' : 'Load more'}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -35,7 +35,7 @@ export default function Navbar() {
     if (isAuthenticated && role === 'customer') {
       api.get('/cart/')
         .then(res => {
-          const totalItems = res.data.reduce((sum, item) => sum + item.quantity, 0);
+          const totalItems = res.data.item_count;
           setCartCount(totalItems);
         })
         .catch(() => setCartCount(0));
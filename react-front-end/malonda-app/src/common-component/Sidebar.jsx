@@ -30,7 +30,7 @@ const Sidebar = () => {
     if (user) {
       api.get('/cart/')
         .then(res => {
-          const totalItems = res.data.reduce((sum, item) => sum + item.quantity, 0);
+          const totalItems = res.data.item_count;
           setCartCount(totalItems);
         })
         .catch(() => setCartCount(0));